@@ -0,0 +1,56 @@
+import time
+
+
+class Clock:
+    def __init__(self, ntp, sync_interval=3600):
+        """
+        Epoch time derived from the monotonic clock, synced with NTP now and then.
+
+        Reading the time does not touch the network: the offset between NTP time and
+        time.monotonic_ns() is measured on `sync` and added to the monotonic clock.
+
+        Args:
+            ntp (adafruit_ntp.NTP): The NTP client.
+            sync_interval (int, optional): Seconds between NTP syncs. Defaults to 3600.
+        """
+        self.ntp = ntp
+        self.sync_interval = sync_interval
+
+        self.__offset_ns = 0
+        self.__synced_at = None
+
+        self.sync()
+
+    def sync(self):
+        """
+        Measures the offset between NTP time and the monotonic clock.
+        """
+        try:
+            epoch_ns = self.ntp.utc_ns
+        except AttributeError:
+            # Older adafruit_ntp versions only have the datetime (whole seconds)
+            epoch_ns = time.mktime(self.ntp.datetime) * 1000000000
+
+        now = time.monotonic_ns()
+        self.__offset_ns = epoch_ns - now
+        self.__synced_at = now
+
+    def sync_if_due(self):
+        """
+        Syncs if the last sync was more than `sync_interval` seconds ago. Keeps the old
+        offset if NTP cannot be reached.
+        """
+        elapsed = time.monotonic_ns() - self.__synced_at
+        if elapsed < self.sync_interval * 1000000000:
+            return
+
+        try:
+            self.sync()
+        except OSError as e:
+            print("Failed to sync time: ", e)
+
+    def epoch_millis(self):
+        """
+        Current time in epoch milliseconds.
+        """
+        return (time.monotonic_ns() + self.__offset_ns) // 1000000
@@ -1,5 +1,6 @@
 import json
 import ssl
+import struct
 import time
 
 import adafruit_minimqtt.adafruit_minimqtt as MQTT
@@ -10,6 +11,8 @@ from adafruit_ble import BLERadio
 from adafruit_ble.advertising import Advertisement
 from adafruit_ble.advertising.standard import ProvideServicesAdvertisement
 
+from clock import Clock
+
 # Get wifi details and more from a secrets.py file
 try:
     from secrets import addresses_to_filter, mqtt_env, secrets
@@ -23,12 +26,29 @@ wifi.radio.connect(secrets["ssid"], secrets["password"])
 # Create a socket pool
 pool = socketpool.SocketPool(wifi.radio)
 
-# Get time server (Network Time Protocol)
+# Get time server (Network Time Protocol), synced at startup and then every
+# `ntp_sync_interval` seconds - timestamps come from the monotonic clock in between
 ntp = adafruit_ntp.NTP(pool, tz_offset=0)
+clock = Clock(ntp, mqtt_env.get("ntp_sync_interval", 3600))
 
 # Bluetooth
 ble = BLERadio()
-counter = 0
+counter = 0  # Sequence number of the binary messages
+
+# Binary payload: magic, version, receiver id, sequence number, epoch milliseconds,
+# 6-byte address and RSSI (must match src/payload.py on the server)
+PAYLOAD_MAGIC = 0xB1
+PAYLOAD_VERSION = 1
+PAYLOAD_FORMAT = "<BBBHQ6sb"
+
+# Binary batch: a header (magic, version, receiver id, sequence number, epoch milliseconds
+# of the first reading, number of readings) followed by the readings (milliseconds after
+# the first reading, 6-byte address and RSSI)
+BATCH_MAGIC = 0xB2
+BATCH_HEADER_FORMAT = "<BBBHQB"
+BATCH_READING_FORMAT = "<H6sb"
+MAX_BATCH_SIZE = 255
+MAX_BATCH_SPAN = 65535  # milliseconds, the largest 16-bit offset
 
 # Set up MQTT client
 mqtt_client = MQTT.MQTT(
@@ -67,16 +87,55 @@ mqtt_client.connect()
 
 
 # Publish a message
-def publish_message(message: str):
+def publish_message(message):
     mqtt_client.publish(mqtt_env["topic"], message)
 
 
-def get_time():
-    current_time = ntp.datetime  # Fetch current time once
-    year, month, day, hour, mins, secs, weekday, yearday, tm_isdst = current_time
-    return "{:02d}/{:02d}/{} {:02d}:{:02d}:{:02d}".format(
-        day, month, year, hour, mins, secs
+def get_epoch_millis():
+    return clock.epoch_millis()
+
+
+def next_sequence():
+    global counter
+    counter = (counter + 1) % 65536
+    return counter
+
+
+def encode_reading(address_bytes, rssi):
+    return struct.pack(
+        PAYLOAD_FORMAT,
+        PAYLOAD_MAGIC,
+        PAYLOAD_VERSION,
+        mqtt_env["receiver_id"],
+        next_sequence(),
+        get_epoch_millis(),
+        bytes(address_bytes),
+        max(-128, min(127, rssi)),
+    )
+
+
+# readings - list of (epoch milliseconds, address bytes, rssi)
+def encode_batch(readings):
+    start = readings[0][0]
+    message = bytearray(
+        struct.pack(
+            BATCH_HEADER_FORMAT,
+            BATCH_MAGIC,
+            PAYLOAD_VERSION,
+            mqtt_env["receiver_id"],
+            next_sequence(),
+            start,
+            len(readings),
+        )
     )
+    for millis, address_bytes, rssi in readings:
+        message += struct.pack(
+            BATCH_READING_FORMAT,
+            millis - start,
+            bytes(address_bytes),
+            max(-128, min(127, rssi)),
+        )
+    return message
 
 
 # Start BLE scan for advertisements
@@ -86,17 +145,20 @@ def start_scan():
         addr_str = "".join("{:02x}".format(b) for b in addr_bytes).lower()
 
         if addr_str in addresses_to_filter:
-            current_time_str = get_time()
-            print(addr_str, current_time_str, "RSSI:", advertisement.rssi)
+            print(addr_str, "RSSI:", advertisement.rssi)
+
+            if mqtt_env.get("payload_format") == "binary":
+                message = encode_reading(addr_bytes, advertisement.rssi)
+            else:
+                message = json.dumps(
+                    {
+                        "address": addr_str,
+                        "time": get_epoch_millis(),
+                        "rssi": advertisement.rssi,
+                    }
+                )
 
             # Send the message to the MQTT broker
-            message = json.dumps(
-                {
-                    "address": addr_str,
-                    "time": current_time_str,
-                    "rssi": advertisement.rssi,
-                }
-            )
             publish_message(message)
 
             ble.stop_scan()
@@ -105,8 +167,65 @@ def start_scan():
     print("Scan done.")
 
 
+def publish_batch(readings, binary):
+    publish_message(encode_batch(readings) if binary else json.dumps(readings))
+
+
+# Scan for `window` seconds and publish every matching advertisement as one message
+def scan_batch(window):
+    binary = mqtt_env.get("payload_format") == "binary"
+    readings = []
+    first = None
+
+    for advertisement in ble.start_scan(
+        ProvideServicesAdvertisement, Advertisement, timeout=window
+    ):
+        addr_bytes = advertisement.address.address_bytes
+        addr_str = "".join("{:02x}".format(b) for b in addr_bytes).lower()
+
+        if addr_str in addresses_to_filter:
+            millis = get_epoch_millis()
+
+            # Publish early rather than overflow the readings' offsets (a slow scan can
+            # run past the window)
+            if readings and millis - first > MAX_BATCH_SPAN:
+                publish_batch(readings, binary)
+                readings = []
+            if not readings:
+                first = millis
+
+            if binary:
+                readings.append((millis, addr_bytes, advertisement.rssi))
+            else:
+                readings.append(
+                    {
+                        "address": addr_str,
+                        "time": millis,
+                        "rssi": advertisement.rssi,
+                    }
+                )
+
+            if len(readings) == MAX_BATCH_SIZE:
+                break
+
+    ble.stop_scan()
+    print("Scan done,", len(readings), "readings.")
+
+    # Send the batch to the MQTT broker
+    if readings:
+        publish_batch(readings, binary)
+
+
+# Longer windows would overflow the readings' offsets
+batch_window = min(mqtt_env.get("batch_window", 0), MAX_BATCH_SPAN // 1000)
+
 while True:
     try:
+        clock.sync_if_due()  # between scans, never inside the scan loop
+
+        if batch_window:
+            scan_batch(batch_window)
+            continue  # scan again straight away
         start_scan()
     except OSError as e:
         ble.stop_scan()  # stop the scan before we try again
@@ -5,5 +5,9 @@ mqtt_env = {
     "username": "user",
     "password": "pwd",
     "topic": "topic",
+    "receiver_id": 1,  # N in the topic receivers/N
+    "payload_format": "json",  # "json" or "binary" (compact struct-packed readings)
+    "ntp_sync_interval": 3600,  # Seconds between NTP time syncs
+    "batch_window": 0,  # Seconds of readings to publish as one message, at most 65 (0 publishes each reading)
 }
 addresses_to_filter = {"address_1"}
@@ -0,0 +1,97 @@
+import numpy as np
+
+
+class RingBuffer:
+    def __init__(self, capacity: int = 20):
+        """
+        A preallocated ring buffer of RSSI readings.
+
+        Every sample is written twice, `capacity` apart, so the most recent samples are
+        always a contiguous slice and windows are returned as views without copying.
+
+        Args:
+            capacity (int, optional): Maximum number of readings kept. Defaults to 20.
+        """
+        self.capacity = capacity
+
+        # Timestamps (epoch milliseconds), raw RSSI and filtered RSSI
+        self.times = np.zeros(2 * capacity, dtype=np.int64)
+        self.rssi = np.zeros(2 * capacity, dtype=np.float32)
+        self.filtered = np.zeros(2 * capacity, dtype=np.float32)
+
+        # Next write position and number of readings stored
+        self.__position = 0
+        self.__size = 0
+
+    def __len__(self) -> int:
+        return self.__size
+
+    def append(self, time: int, rssi: float, filtered: float):
+        """
+        Adds a reading, replacing the oldest one when the buffer is full.
+
+        Args:
+            time (int): Time of the reading in epoch milliseconds.
+            rssi (float): The raw RSSI value.
+            filtered (float): The filtered RSSI value.
+        """
+        position = self.__position
+        mirror = position + self.capacity
+
+        self.times[position] = self.times[mirror] = time
+        self.rssi[position] = self.rssi[mirror] = rssi
+        self.filtered[position] = self.filtered[mirror] = filtered
+
+        self.__position = (position + 1) % self.capacity
+        if self.__size < self.capacity:
+            self.__size += 1
+
+    def window(self, size: int = None) -> tuple:
+        """
+        Gets the most recent readings, oldest first, as views into the buffer.
+
+        The views are only valid until the next `append` overwrites them; copy them if
+        they need to be kept.
+
+        Args:
+            size (int, optional): Number of readings. Defaults to all stored readings.
+
+        Returns:
+            tuple: (times, rssi, filtered) arrays.
+        """
+        if size is None or size > self.__size:
+            size = self.__size
+
+        end = self.__position + self.capacity
+        start = end - size
+        return self.times[start:end], self.rssi[start:end], self.filtered[start:end]
+
+    def last(self) -> tuple:
+        """
+        Gets the most recent reading.
+
+        Returns:
+            tuple: (time, rssi, filtered), or None if the buffer is empty.
+        """
+        if not self.__size:
+            return None
+
+        index = self.__position + self.capacity - 1
+        return (
+            self.times.item(index),
+            self.rssi.item(index),
+            self.filtered.item(index),
+        )
+
+    def clear(self):
+        """
+        Removes all readings.
+        """
+        self.__position = 0
+        self.__size = 0
+
+    def __str__(self):
+        return f"RingBuffer(size={self.__size}, capacity={self.capacity})"
+
+    def __repr__(self):
+        return self.__str__()
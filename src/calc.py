@@ -1,109 +1,357 @@
-from scipy.optimize import least_squares
+import math
+
+import numpy as np
+from scipy.optimize import OptimizeResult, least_squares
+
+from fingerprint import FingerprintGrid
+from transform import GridTransform
+
+# Available trilateration solvers
+SOLVERS = ("least_squares", "linear", "linear_refined", "grid")
 
 
 class TrilaterationController:
     def __init__(
         self,
-        bp_1: tuple,
-        bp_2: tuple,
-        bp_3: tuple,
+        base_stations: list,
         scale=32,
-        measured_power_1=-69,
-        measured_power_2=-69,
-        measured_power_3=-69,
+        measured_power=-69,
         path_loss_exponent=1.8,
+        solver="least_squares",
+        strongest=None,
+        grid_metric="distance",
     ):
         """
         Initialize the trilateration controller.
 
         Args:
-            bp_1 (tuple): Position of base station 1.
-            bp_2 (tuple): Position of base station 2.
-            bp_3 (tuple): Position of base station 3.
+            base_stations (list): Positions (x, y) of the base stations (at least 3).
             scale (int, optional): Grid scale. Defaults to 32.
-            measured_power_1 (int, optional): Measured power at base station 1. Defaults to -69.
-            measured_power_2 (int, optional): Measured power at base station 2. Defaults to -69.
-            measured_power_3 (int, optional): Measured power at base station 3. Defaults to -69.
+            measured_power (int | list, optional): Measured power at each base station, or
+                a single value shared by all of them. Defaults to -69.
             path_loss_exponent (float, optional): Path loss exponent. Defaults to 1.8.
+            solver (str, optional): Trilateration solver, one of "least_squares" (iterative
+                solve from the origin), "linear" (closed-form linearised solve) or
+                "linear_refined" (linear solve refined by least squares with an analytic
+                Jacobian) or "grid" (best matching cell of a precomputed fingerprint grid).
+                Defaults to "least_squares".
+            strongest (int, optional): Number of base stations with the strongest RSSI to use
+                for each fix. Defaults to None (use all of them).
+            grid_metric (str, optional): Matching metric of the "grid" solver, "distance" or
+                "rssi" (KD-tree over expected RSSI vectors). Defaults to "distance".
         """
+        if solver not in SOLVERS:
+            raise ValueError("Invalid solver: " + str(solver))
+
         # Base station positions
-        self.bp_1 = bp_1
-        self.bp_2 = bp_2
-        self.bp_3 = bp_3
+        self.base_stations = np.array(base_stations, dtype=float).reshape(-1, 2)
+        if len(self.base_stations) < 3:
+            raise ValueError("At least 3 base stations are required")
 
-        # Grid scale
+        # Grid scale and the transform from world coordinates to grid cells
         self.scale = scale
+        self.transform = GridTransform.from_base_stations(self.base_stations, scale)
+
+        # Measured power (per base station) and path loss exponent, which also set up
+        # the precomputed RSSI to distance model
+        self._measured_power = None
+        self._path_loss_exponent = path_loss_exponent
+        self.measured_power = measured_power
+
+        # Solver settings
+        self.solver = solver
+        self.strongest = strongest
+        self.grid_metric = grid_metric
+
+        # Precomputed linearised system (depends only on the base stations).
+        # Row i of the system for reference station j is
+        # 2 * (p_i - p_j) . (x, y) = d_j^2 - d_i^2 + |p_i|^2 - |p_j|^2
+        sq_norms = np.sum(self.base_stations**2, axis=1)
+        self._differences = 2 * (self.base_stations[None, :] - self.base_stations[:, None])
+        self._offsets = sq_norms[None, :] - sq_norms[:, None]
+
+        # Pseudo-inverse for the full set of base stations (referenced to the first)
+        self._linear_pinv = np.linalg.pinv(self._differences[0, 1:])
+        self._linear_offsets = self._offsets[0, 1:]
+
+        # Fingerprint grid covering the display area
+        self.grid = None
+        if solver == "grid":
+            self.grid = FingerprintGrid(self.base_stations, self.transform, grid_metric)
+
+    def get_config(self) -> dict:
+        """
+        Gets the constructor arguments of this controller, e.g. to build an identical
+        controller in another process.
+
+        Returns:
+            dict: Keyword arguments for `TrilaterationController`.
+        """
+        return {
+            "base_stations": self.base_stations.tolist(),
+            "scale": self.scale,
+            "measured_power": self.measured_power.tolist(),
+            "path_loss_exponent": self.path_loss_exponent,
+            "solver": self.solver,
+            "strongest": self.strongest,
+            "grid_metric": self.grid_metric,
+        }
+
+    @property
+    def size(self) -> int:
+        """
+        Number of base stations.
+        """
+        return len(self.base_stations)
+
+    @property
+    def measured_power(self) -> np.ndarray:
+        """
+        Measured power at each base station (read-only array, assign to recalibrate).
+        """
+        return self._measured_power
+
+    @measured_power.setter
+    def measured_power(self, measured_power):
+        measured_power = np.broadcast_to(
+            np.asarray(measured_power, dtype=float), self.size
+        ).copy()
+        measured_power.flags.writeable = False
+
+        self._measured_power = measured_power
+        self._update_distance_model()
+
+    @property
+    def path_loss_exponent(self) -> float:
+        """
+        Path loss exponent (assign to recalibrate).
+        """
+        return self._path_loss_exponent
 
-        # Measured power and path loss exponent
-        self.measured_power_1 = measured_power_1
-        self.measured_power_2 = measured_power_2
-        self.measured_power_3 = measured_power_3
-        self.path_loss_exponent = path_loss_exponent
+    @path_loss_exponent.setter
+    def path_loss_exponent(self, path_loss_exponent: float):
+        self._path_loss_exponent = path_loss_exponent
+        self._update_distance_model()
 
-    def get_position(self, rssi_1: float, rssi_2: float, rssi_3: float) -> tuple:
+    def _update_distance_model(self):
+        """
+        Precomputes the path loss model for every base station.
+
+        distance = 10 ** ((measured_power - rssi) / (10 * n)) is rewritten as
+        coefficient * exp(-decay * rssi), so a conversion is one multiply and one exp.
+        """
+        self._distance_decay = math.log(10) / (10 * self._path_loss_exponent)
+        self._distance_coefficients = np.exp(self._measured_power * self._distance_decay)
+        self._distance_coefficients_list = self._distance_coefficients.tolist()
+
+    def get_position(self, *rssi: float, strongest: int = None) -> tuple:
         """
         Calculates the estimated position based on the received signal strength indicator (RSSI) values
-        and the known positions of three base stations.
+        and the known positions of the base stations.
 
         Args:
-            rssi_1 (float): The RSSI value received from base station 1.
-            rssi_2 (float): The RSSI value received from base station 2.
-            rssi_3 (float): The RSSI value received from base station 3.
+            *rssi (float): The RSSI value received from each base station, in order.
+            strongest (int, optional): Only use this many base stations with the strongest
+                RSSI. Defaults to the controller's `strongest` setting.
 
         Returns:
             tuple: The estimated position (x, y) scaled to fit within a 32x32 grid.
         """
+        # Pick the base stations to use
+        anchors = self.select_anchors(rssi, strongest)
+
         # Calculate distances
-        d1 = self.get_distance(rssi_1, 1)
-        d2 = self.get_distance(rssi_2, 2)
-        d3 = self.get_distance(rssi_3, 3)
+        distances = self.get_distances(rssi, anchors)
 
         # Trilateration
-        estimated_x, estimated_y = self.trilaterate(d1, d2, d3)
+        estimated_x, estimated_y = self.trilaterate(*distances, anchors=anchors)
 
         # Scale the coordinates to fit within a 32x32 grid
         scaled_x, scaled_y = self.scale_coordinates(estimated_x, estimated_y)
 
         return scaled_x, scaled_y
 
-    def trilaterate(self, d1: float, d2: float, d3: float) -> tuple:
+    def select_anchors(self, rssi: list, strongest: int = None) -> np.ndarray:
         """
-        Trilaterates the position (X, Y) given the distances of three points.
+        Selects the base stations with the strongest RSSI values. Base stations without a
+        value (NaN) are never selected.
 
         Args:
-            d1 (float): distance from the first point to the unknown position.
-            d2 (float): distance from the second point to the unknown position.
-            d3 (float): distance from the third point to the unknown position.
+            rssi (list): The RSSI value received from each base station.
+            strongest (int, optional): Number of base stations to select. Defaults to the
+                controller's `strongest` setting.
+
+        Returns:
+            np.ndarray: Indices of the selected base stations, strongest first, or None
+                when all base stations are used.
+        """
+        if strongest is None:
+            strongest = self.strongest
+        if strongest is not None and strongest < 3:
+            raise ValueError("At least 3 base stations are required")
+
+        rssi = np.asarray(rssi, dtype=float)
+        available = np.flatnonzero(np.isfinite(rssi))
+        if len(available) == self.size and (strongest is None or strongest >= self.size):
+            return None
+        if len(available) < 3:
+            raise ValueError("At least 3 base stations with RSSI values are required")
+
+        return available[np.argsort(rssi[available])[::-1]][:strongest]
+
+    def trilaterate(self, *distances: float, anchors: np.ndarray = None) -> tuple:
+        """
+        Trilaterates the position (X, Y) given the distances to the base stations.
+
+        Args:
+            *distances (float): distance from each base station to the unknown position.
+            anchors (np.ndarray, optional): Indices of the base stations the distances
+                belong to. Defaults to None (all base stations, in order).
 
         Returns:
             tuple: The (X, Y) coordinates of the unknown position.
         """
-        x1, y1 = self.bp_1
-        x2, y2 = self.bp_2
-        x3, y3 = self.bp_3
+        if self.solver == "linear":
+            return self.linear_trilaterate(*distances, anchors=anchors)
+        if self.solver == "grid":
+            return self.grid.locate(*distances, anchors=anchors)
+
+        # Return the estimated coordinates
+        coordinates = self.solve(distances, anchors=anchors).x
+        return coordinates[0], coordinates[1]
 
-        # Formula:
-        # (x - x1)^2 + (y - y1)^2 = d1^2
-        # (x - x2)^2 + (y - y2)^2 = d2^2
-        # (x - x3)^2 + (y - y3)^2 = d3^2
+    def solve(
+        self, distances: list, initial_guess: tuple = None, anchors: np.ndarray = None
+    ) -> OptimizeResult:
+        """
+        Solves the trilateration equations for (X, Y, r) with least squares, where r
+        is a shared bias on the measured distances.
+
+        Args:
+            distances (list): distance from each base station to the unknown position.
+            initial_guess (tuple, optional): Starting (X, Y, r), e.g. the previous fix of
+                the same device. Defaults to the origin for the "least_squares" solver and
+                to the linear solution otherwise.
+            anchors (np.ndarray, optional): Indices of the base stations the distances
+                belong to. Defaults to None (all base stations, in order).
+
+        Returns:
+            OptimizeResult: The least squares result (`x`, `njev`, `success`, ...).
+        """
+        positions = self.base_stations if anchors is None else self.base_stations[anchors]
+        px, py = positions[:, 0], positions[:, 1]
+        d = np.asarray(distances, dtype=float)
+
+        # Formula (for each base station i):
+        # (x - xi)^2 + (y - yi)^2 = (di - r)^2
         def equations(guess):
             x, y, r = guess
 
-            return (
-                (x - x1) ** 2 + (y - y1) ** 2 - (d1 - r) ** 2,
-                (x - x2) ** 2 + (y - y2) ** 2 - (d2 - r) ** 2,
-                (x - x3) ** 2 + (y - y3) ** 2 - (d3 - r) ** 2,
-            )
+            return (x - px) ** 2 + (y - py) ** 2 - (d - r) ** 2
 
-        # Initial guess
-        initial_guess = (0, 0, 0)
+        # Partial derivatives of the equations with respect to (x, y, r)
+        def jacobian(guess):
+            x, y, r = guess
 
-        # Use least squares to solve the equations
-        results = least_squares(equations, initial_guess)
+            return np.column_stack((2 * (x - px), 2 * (y - py), 2 * (d - r)))
 
-        # Return the estimated coordinates
-        coordinates = results.x
-        return coordinates[0], coordinates[1]
+        if initial_guess is None and self.solver == "least_squares":
+            initial_guess = (0, 0, 0)
+            return least_squares(equations, initial_guess)
+
+        # Warm start from the given guess or the exact solution of the linearised equations
+        if initial_guess is None:
+            initial_guess = (*self.linear_trilaterate(*d, anchors=anchors), 0)
+
+        return least_squares(equations, initial_guess, jac=jacobian)
+
+    def linear_trilaterate(self, *distances: float, anchors: np.ndarray = None) -> tuple:
+        """
+        Solves the linearised trilateration equations in closed form.
+
+        Subtracting the first circle equation from the others removes the quadratic
+        terms. For the full set of base stations the position is the precomputed
+        pseudo-inverse applied to a vector built from the distances; for a subset the
+        matching rows of the precomputed system are solved directly.
+
+        Args:
+            *distances (float): distance from each base station to the unknown position.
+            anchors (np.ndarray, optional): Indices of the base stations the distances
+                belong to. Defaults to None (all base stations, in order).
+
+        Returns:
+            tuple: The (X, Y) coordinates of the unknown position.
+        """
+        sq_distances = np.square(distances, dtype=float)
+        b = sq_distances[0] - sq_distances[1:]
+
+        if anchors is None:
+            x, y = self._linear_pinv @ (b + self._linear_offsets)
+        else:
+            reference, others = anchors[0], anchors[1:]
+            b += self._offsets[reference, others]
+            a = self._differences[reference, others]
+            x, y = np.linalg.lstsq(a, b, rcond=None)[0]
+
+        return float(x), float(y)
+
+    def get_positions_batch(
+        self, rssi: np.ndarray, refine: bool = True, iterations: int = 10
+    ) -> np.ndarray:
+        """
+        Calculates the estimated positions for many sets of RSSI values at once.
+
+        Args:
+            rssi (np.ndarray): An (N, K) array of RSSI values, one row per fix and
+                one column per base station.
+            refine (bool, optional): Whether to refine the closed-form solution with
+                Gauss-Newton iterations. Defaults to True.
+            iterations (int, optional): Number of refinement iterations. Defaults to 10.
+
+        Returns:
+            np.ndarray: An (N, 2) integer array of positions scaled to the grid.
+        """
+        rssi = np.asarray(rssi, dtype=float).reshape(-1, self.size)
+        distances = self.get_distances(rssi)
+
+        positions = self.trilaterate_batch(distances, refine, iterations)
+
+        # Scale the coordinates to fit within the grid
+        return self.transform.to_cells(positions)
+
+    def trilaterate_batch(
+        self, distances: np.ndarray, refine: bool = True, iterations: int = 10
+    ) -> np.ndarray:
+        """
+        Trilaterates many positions at once from an (N, K) array of distances.
+
+        The circle equations are linearised by subtracting the first from the others,
+        which gives a linear system per fix with a shared, precomputed pseudo-inverse.
+        The result is then optionally refined with a damped Gauss-Newton solve of the
+        same equations used by `trilaterate` (including the `r` bias term). The "grid"
+        solver matches all fixes against the fingerprint grid instead.
+
+        Args:
+            distances (np.ndarray): An (N, K) array of distances to the base stations.
+            refine (bool, optional): Whether to refine the linear solution. Defaults to True.
+            iterations (int, optional): Number of refinement iterations. Defaults to 10.
+
+        Returns:
+            np.ndarray: An (N, 2) array of (X, Y) coordinates.
+        """
+        distances = np.asarray(distances, dtype=float).reshape(-1, self.size)
+        if self.solver == "grid":
+            return self.grid.locate_batch(distances)
+
+        positions = _linear_trilaterate(
+            self.base_stations, distances, self._linear_pinv
+        )
+        if refine:
+            positions = _gauss_newton(
+                self.base_stations, distances, positions, iterations
+            )
+
+        return positions
 
     def get_distance(self, rssi: float, node: int) -> float:
         """
@@ -111,21 +359,35 @@ class TrilaterationController:
 
         Parameters:
         - rssi (float): The received signal strength indicator in dBm.
-        - node (int): The node number (1, 2, or 3) corresponding to the base station.
+        - node (int): The node number (1 to the number of base stations).
 
         Returns:
         - distance (float): The calculated distance between the devices in meters.
         """
-        if node == 1:
-            measured_power = self.measured_power_1
-        elif node == 2:
-            measured_power = self.measured_power_2
-        elif node == 3:
-            measured_power = self.measured_power_3
-        else:
+        if not 1 <= node <= self.size:
             raise ValueError("Invalid node number")
 
-        return 10 ** ((measured_power - rssi) / (10 * self.path_loss_exponent))
+        coefficient = self._distance_coefficients_list[node - 1]
+        return coefficient * math.exp(-self._distance_decay * rssi)
+
+    def get_distances(self, rssi: np.ndarray, anchors: np.ndarray = None) -> np.ndarray:
+        """
+        Converts the RSSI values of several base stations to distances.
+
+        Parameters:
+        - rssi (np.ndarray): The RSSI value received from each base station. The last
+          axis is the base station, so an (N, K) array converts N fixes at once.
+        - anchors (np.ndarray, optional): Only convert the values of these base stations.
+
+        Returns:
+        - distances (np.ndarray): The distances to the (selected) base stations in meters.
+        """
+        rssi = np.asarray(rssi, dtype=float)
+        coefficients = self._distance_coefficients
+        if anchors is not None:
+            rssi, coefficients = rssi[..., anchors], coefficients[anchors]
+
+        return coefficients * np.exp(-self._distance_decay * rssi)
 
     def scale_coordinates(self, x: float, y: float) -> tuple:
         """
@@ -138,64 +400,209 @@ class TrilaterationController:
         Returns:
         tuple: A tuple containing the scaled x and y coordinates.
         """
-        # Maximum x and y values from the base stations
-        initial_x = max(self.bp_1[0], self.bp_2[0], self.bp_3[0])
-        initial_y = max(self.bp_1[1], self.bp_2[1], self.bp_3[1])
+        return self.transform.to_cell(x, y)
 
-        # Scale the coordinates
-        scaled_x = int((x / initial_x) * self.scale)
-        scaled_y = int((y / initial_y) * self.scale)
+    def __str__(self):
+        return f"TrilaterationController(base_stations={self.base_stations.tolist()})"
 
-        # Ensure the scaled coordinates are within the grid
-        scaled_x = max(0, min(scaled_x, self.scale - 1))
-        scaled_y = max(0, min(scaled_y, self.scale - 1))
+    def __repr__(self):
+        return self.__str__()
 
-        return scaled_x, scaled_y
+
+class TrackingSession:
+    def __init__(self, controller: TrilaterationController):
+        """
+        Initialize a tracking session for a single device.
+
+        The session remembers the last solution (including the `r` bias term) and uses
+        it as the initial guess for the next solve, since a tracked device only moves a
+        short distance between updates.
+
+        Args:
+            controller (TrilaterationController): The controller used to solve positions.
+        """
+        self.controller = controller
+
+        # Last (X, Y, r) solution, used to warm start the next solve
+        self.solution = None
+
+        # Solver statistics
+        self.fixes = 0
+        self.iterations = 0
+        self.total_iterations = 0
+        self.converged = False
+
+    def get_position(self, *rssi: float, strongest: int = None) -> tuple:
+        """
+        Calculates the estimated position of the device, warm started from its last fix.
+
+        Args:
+            *rssi (float): The RSSI value received from each base station, in order.
+            strongest (int, optional): Only use this many base stations with the strongest
+                RSSI. Defaults to the controller's `strongest` setting.
+
+        Returns:
+            tuple: The estimated position (x, y) scaled to fit within the grid.
+        """
+        anchors = self.controller.select_anchors(rssi, strongest)
+        distances = self.controller.get_distances(rssi, anchors)
+
+        estimated_x, estimated_y = self.trilaterate(*distances, anchors=anchors)
+
+        return self.controller.scale_coordinates(estimated_x, estimated_y)
+
+    def trilaterate(self, *distances: float, anchors: np.ndarray = None) -> tuple:
+        """
+        Trilaterates the position (X, Y), warm started from the previous solution.
+
+        Args:
+            *distances (float): distance from each base station to the unknown position.
+            anchors (np.ndarray, optional): Indices of the base stations the distances
+                belong to. Defaults to None (all base stations, in order).
+
+        Returns:
+            tuple: The (X, Y) coordinates of the unknown position.
+        """
+        if self.controller.solver in ("linear", "grid"):
+            x, y = self.controller.trilaterate(*distances, anchors=anchors)
+            self.record((x, y, 0.0))
+        else:
+            results = self.controller.solve(
+                distances, initial_guess=self.solution, anchors=anchors
+            )
+            # least_squares evaluates the Jacobian once per iteration (nfev also counts
+            # the function evaluations of rejected steps)
+            self.record(tuple(results.x.tolist()), results.njev, results.success)
+
+        return self.solution[0], self.solution[1]
+
+    def record(self, solution: tuple, iterations: int = 0, converged: bool = True):
+        """
+        Records a solution computed elsewhere (e.g. by a `SolverPool` worker).
+
+        Args:
+            solution (tuple): The (X, Y, r) solution.
+            iterations (int, optional): Number of solver iterations. Defaults to 0.
+            converged (bool, optional): Whether the solver converged. Defaults to True.
+        """
+        self.solution = solution
+        self.iterations = iterations
+        self.converged = converged
+
+        self.fixes += 1
+        self.total_iterations += iterations
+
+    def reset(self):
+        """
+        Forget the last solution so the next solve starts from scratch.
+        """
+        self.solution = None
+        self.converged = False
 
     def __str__(self):
-        return f"TrilaterationController(bp_1={self.bp_1}, bp_2={self.bp_2}, bp_3={self.bp_3})"
+        return f"TrackingSession(solution={self.solution}, fixes={self.fixes}, iterations={self.iterations})"
 
     def __repr__(self):
         return self.__str__()
 
 
+def _linear_trilaterate(
+    anchors: np.ndarray, distances: np.ndarray, pinv: np.ndarray = None
+) -> np.ndarray:
+    """
+    Solves the linearised trilateration problem for every row of `distances`.
+
+    Subtracting the first circle equation from the others removes the quadratic
+    terms, leaving A @ (x, y) = b with A fixed by the anchor positions.
+
+    Args:
+        anchors (np.ndarray): A (K, 2) array of base station positions.
+        distances (np.ndarray): An (N, K) array of distances.
+        pinv (np.ndarray, optional): Precomputed pseudo-inverse of A. Defaults to None.
+
+    Returns:
+        np.ndarray: An (N, 2) array of (X, Y) coordinates.
+    """
+    if pinv is None:
+        pinv = np.linalg.pinv(2 * (anchors[1:] - anchors[0]))
+
+    sq_norms = np.sum(anchors**2, axis=1)
+    b = (
+        distances[:, :1] ** 2
+        - distances[:, 1:] ** 2
+        + (sq_norms[1:] - sq_norms[0])
+    )
+    return b @ pinv.T
+
+
+def _gauss_newton(
+    anchors: np.ndarray,
+    distances: np.ndarray,
+    positions: np.ndarray,
+    iterations: int,
+    damping: float = 1e-6,
+) -> np.ndarray:
+    """
+    Refines positions with damped Gauss-Newton steps on the equations
+    (x - xi)^2 + (y - yi)^2 - (di - r)^2 = 0, solved for (x, y, r).
+
+    Args:
+        anchors (np.ndarray): A (K, 2) array of base station positions.
+        distances (np.ndarray): An (N, K) array of distances.
+        positions (np.ndarray): An (N, 2) array of starting positions.
+        iterations (int): Number of steps to take.
+        damping (float, optional): Levenberg damping term. Defaults to 1e-6.
+
+    Returns:
+        np.ndarray: An (N, 2) array of refined (X, Y) coordinates.
+    """
+    n = distances.shape[0]
+    x, y = positions[:, 0].copy(), positions[:, 1].copy()
+    r = np.zeros(n)
+    identity = np.eye(3) * damping
+
+    for _ in range(iterations):
+        dx = x[:, None] - anchors[:, 0]
+        dy = y[:, None] - anchors[:, 1]
+        dr = distances - r[:, None]
+
+        residuals = dx**2 + dy**2 - dr**2
+        jacobian = np.stack((2 * dx, 2 * dy, 2 * dr), axis=2)
+
+        jtj = np.einsum("nki,nkj->nij", jacobian, jacobian) + identity
+        jtr = np.einsum("nki,nk->ni", jacobian, residuals)
+        step = np.linalg.solve(jtj, -jtr[..., None])[..., 0]
+
+        x += step[:, 0]
+        y += step[:, 1]
+        r += step[:, 2]
+
+    return np.column_stack((x, y))
+
+
 if __name__ == "__main__":
     val = "-47 | -42 | -42"
     # val = "-42 | -42 | -42"
     # val = "-28 | -62 | -45"
-    val_str = list(map(float, val.split(" | ")))
+    rssi = list(map(float, val.split(" | ")))
 
     # Test data
-    receiver_1_pos = (0, 2.2)
-    rssi_1 = val_str[0]
-
-    receiver_2_pos = (3.2, 0)
-    rssi_2 = val_str[1]
-
-    receiver_3_pos = (3.2, 3.1)
-    rssi_3 = val_str[2]
+    receiver_positions = [(0, 2.2), (3.2, 0), (3.2, 3.1)]
 
     # Test TrilaterationController
     position_estimator = TrilaterationController(
-        receiver_1_pos,
-        receiver_2_pos,
-        receiver_3_pos,
-        measured_power_1=-40,
-        measured_power_2=-40,
-        measured_power_3=-40,
+        receiver_positions,
+        measured_power=-40,
         path_loss_exponent=1.8,
     )
-    position = position_estimator.get_position(rssi_1, rssi_2, rssi_3)
+    position = position_estimator.get_position(*rssi)
 
-    d1 = position_estimator.get_distance(rssi_1, 1)
-    d2 = position_estimator.get_distance(rssi_2, 2)
-    d3 = position_estimator.get_distance(rssi_3, 3)
-    position2 = position_estimator.trilaterate(d1, d2, d3)
+    distances = position_estimator.get_distances(rssi)
+    position2 = position_estimator.trilaterate(*distances)
 
     # Distances
-    print(f"Distance from receiver 1: {position_estimator.get_distance(rssi_1, 1)}")
-    print(f"Distance from receiver 2: {position_estimator.get_distance(rssi_2, 2)}")
-    print(f"Distance from receiver 3: {position_estimator.get_distance(rssi_3, 3)}")
+    for i, distance in enumerate(distances, start=1):
+        print(f"Distance from receiver {i}: {distance}")
     print()
 
     print(f"Estimated position: {position}")
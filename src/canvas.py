@@ -0,0 +1,121 @@
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Layers in drawing order (later layers are drawn over earlier ones)
+LAYERS = ("trails", "beacons", "objects")
+
+
+class Canvas:
+    def __init__(self, size: int = 32, background=None):
+        """
+        A size x size RGB image made of a background and layers of points.
+
+        The background is a read-only (size, size, 3) uint8 array that is shared, not
+        copied, between canvases; it is only copied when the canvas is rendered, and the
+        layers are then drawn over the copy. Pixel [x, y] is row x, column y of the image
+        (the same layout as the nested lists used for backgrounds).
+
+        Args:
+            size (int, optional): The size of the image. Defaults to 32.
+            background (optional): A (size, size, 3) array or 2D list of RGB tuples.
+                Defaults to a black screen.
+        """
+        self.size = size
+        self.background = None
+        self.set_background(background)
+
+        # Layer name -> (points (N, 2), colors (N, 3))
+        self.__layers = {}
+
+    def set_background(self, background=None):
+        """
+        Sets the background, copying it unless it already is a read-only uint8 array.
+
+        Args:
+            background (optional): A (size, size, 3) array or 2D list of RGB tuples.
+                Defaults to a black screen.
+        """
+        if background is None:
+            background = np.zeros((self.size, self.size, 3), dtype=np.uint8)
+        elif not (
+            isinstance(background, np.ndarray)
+            and background.dtype == np.uint8
+            and not background.flags.writeable
+        ):
+            background = np.array(background, dtype=np.uint8)
+
+        if background.shape != (self.size, self.size, 3):
+            raise ValueError("Invalid background shape: " + str(background.shape))
+
+        background.flags.writeable = False
+        self.background = background
+
+    def set_layer(self, name: str, points: List[Tuple[int, int]], color: tuple):
+        """
+        Sets the points of a layer, all in one color.
+
+        Args:
+            name (str): The layer, one of `LAYERS`.
+            points (List[Tuple[int, int]]): The (x, y) pixels of the layer.
+            color (tuple): The RGB color of the points.
+        """
+        points = np.asarray(points, dtype=np.intp).reshape(-1, 2)
+        self.set_layer_colors(name, points, np.broadcast_to(color, (len(points), 3)))
+
+    def set_layer_colors(self, name: str, points: np.ndarray, colors: np.ndarray):
+        """
+        Sets the points of a layer, each with its own color (e.g. a fading trail).
+
+        Args:
+            name (str): The layer, one of `LAYERS`.
+            points (np.ndarray): An (N, 2) array of (x, y) pixels.
+            colors (np.ndarray): An (N, 3) array of RGB colors.
+        """
+        if name not in LAYERS:
+            raise ValueError("Invalid layer: " + str(name))
+
+        self.__layers[name] = (
+            np.asarray(points, dtype=np.intp).reshape(-1, 2),
+            np.asarray(colors, dtype=np.uint8).reshape(-1, 3),
+        )
+
+    def clear_layer(self, name: str):
+        """
+        Removes all points from a layer.
+
+        Args:
+            name (str): The layer.
+        """
+        self.__layers.pop(name, None)
+
+    def render(self) -> np.ndarray:
+        """
+        Composites the layers over the background.
+
+        Returns:
+            np.ndarray: A new (size, size, 3) uint8 array.
+        """
+        frame = self.background.copy()
+        for name in LAYERS:
+            layer = self.__layers.get(name)
+            if layer is not None:
+                points, colors = layer
+                frame[points[:, 0], points[:, 1]] = colors
+        return frame
+
+    def to_image(self) -> Image.Image:
+        """
+        Renders the canvas as a PIL image.
+
+        Returns:
+            Image.Image: The RGB image.
+        """
+        return Image.fromarray(self.render())
+
+    def __str__(self):
+        return f"Canvas(size={self.size}, layers={list(self.__layers)})"
+
+    def __repr__(self):
+        return self.__str__()
@@ -1,30 +1,70 @@
 # This will contain the MQTT client and the controller logic
 import asyncio
+import time
 from typing import List, Tuple
 
+import numpy as np
 from bleak import BleakScanner
 
-from image import generate_image_payload
+from canvas import Canvas
+from image import PayloadCache, PngEncoder, diff_frames, generate_pixel_payloads
 from libs.bluetooth import Bluetooth
+from transform import GridTransform
 
 
 class Controller:
-    def __init__(self, address: str = "DC:03:BB:B0:67:4A"):
+    def __init__(
+        self,
+        address: str = "DC:03:BB:B0:67:4A",
+        chunk_delay: float = 0.01,
+        write_response: bool = None,
+        max_delta_pixels: int = 8,
+        cache_size: int = 1024,
+    ):
         """
         Initializes the Controller object.
 
         Args:
             address (str): The Bluetooth address to connect to. Defaults to "DC:03:BB:B0:67:4A".
+            chunk_delay (float): Seconds to pause between the BLE chunks of a frame (without
+                blocking the event loop). Defaults to 0.01.
+            write_response (bool): Whether chunks are written with response (each write waits
+                for the display's acknowledgement), without response (False) or with the
+                characteristic's default (None). Defaults to None.
+            max_delta_pixels (int): Maximum number of changed pixels sent as single pixel updates
+                instead of a full frame (0 always sends full frames). Defaults to 8.
+            cache_size (int): Maximum number of rendered frames and payloads kept in the cache.
+                Defaults to 1024 (every cell of the display).
 
         Raises:
             Exception: If there is an error connecting to the Bluetooth device.
         """
 
-        self.__background = [[(0, 0, 0) for _ in range(32)] for _ in range(32)]
+        self.__canvas = Canvas(32)
+        self.__background_version = 0
         self.__beacons = [(0, 0), (0, 31), (31, 0)]
+        self.__transform = GridTransform((32, 32))
         self.__started = False
+
+        # Frame currently on the display (None if unknown), updated pixel by pixel
+        # when only a few pixels change
+        self.__frame = None
+        self.max_delta_pixels = max_delta_pixels
+
+        # Rendered frames and their payloads
+        self.payloads = PayloadCache(cache_size)
+
+        # Update policy (see set_update_policy) and the position currently displayed
+        self.__min_movement = 1
+        self.__min_dwell = 0.0
+        self.__refresh_interval = None
+        self.__displayed = None
+        self.__displayed_at = None
+        # Cell the tag moved to, and since when it has been reported there
+        self.__candidate = None
+        self.__moved_at = None
         try:
-            self.__bt = Bluetooth(address)
+            self.__bt = Bluetooth(address, chunk_delay, write_response)
         except Exception as e:
             print(f"Could not connect to bluetooth: {e}")
             raise e
@@ -62,6 +102,10 @@ class Controller:
         """
         Plot the position (x, y) on the image.
 
+        Positions are filtered by the update policy (see `set_update_policy`). Only the pixels
+        that changed since the last frame are sent (as single pixel updates) if there are at
+        most `max_delta_pixels` of them, and nothing is sent if the frame is unchanged.
+
         Parameters:
         - x (int): The x-coordinate of the position.
         - y (int): The y-coordinate of the position.
@@ -74,13 +118,124 @@ class Controller:
         if not self.__started:
             await self.__image_mode_on()
             self.__started = True
+            self.__frame = None
 
-        # Send image payload
-        await self.__bt.send(
-            generate_image_payload((x, y), self.__beacons, background=self.__background)
+        now = time.monotonic()
+        if not self.__should_plot(x, y, now):
+            return
+
+        frame, payload = self.payloads.get(
+            (x, y),
+            self.__beacons,
+            background=self.__canvas.background,
+            background_version=self.__background_version,
         )
+        if np.array_equal(frame, self.__frame):
+            print(f"Position {x}, {y} already displayed")
+            return
+
+        # Send only the changed pixels, or the full image payload
+        pixels = None if self.__frame is None else diff_frames(self.__frame, frame)
+        if pixels is not None and len(pixels) <= self.max_delta_pixels:
+            sent = await self.__send_pixels(pixels)
+        else:
+            sent = await self.__bt.send(payload)
+
+        if sent:
+            self.__frame = frame
+            self.__displayed = (x, y)
+            self.__displayed_at = now
+            self.__candidate = None
+            self.__moved_at = None
+            print(
+                f"Finished plotting position {x}, {y} in {self.__bt.last_send_duration:.3f}s"
+            )
+        else:
+            # The display may hold a partial update
+            self.__frame = None
+
+    def __should_plot(self, x: int, y: int, now: float) -> bool:
+        """
+        Applies the update policy to a new position.
+
+        Args:
+            x (int): The x-coordinate of the position.
+            y (int): The y-coordinate of the position.
+            now (float): The current monotonic time.
+
+        Returns:
+            bool: Whether the position should be plotted. A forced refresh also clears the
+                displayed frame so the full frame is sent.
+        """
+        if self.__displayed is None:
+            return True
+
+        # Resend the full frame now and then, in case the display missed an update
+        if (
+            self.__refresh_interval is not None
+            and now - self.__displayed_at >= self.__refresh_interval
+        ):
+            self.__frame = None
+            return True
+
+        # Ignore small movements (jitter around a cell boundary)
+        displayed_x, displayed_y = self.__displayed
+        movement = max(abs(x - displayed_x), abs(y - displayed_y))
+        if movement < self.__min_movement:
+            self.__candidate = None
+            self.__moved_at = None
+            return False
+
+        # Only move once the new position has held for the minimum dwell time, restarting
+        # the timer whenever the tag moves on to another cell
+        if self.__candidate is None or (
+            max(abs(x - self.__candidate[0]), abs(y - self.__candidate[1]))
+            >= self.__min_movement
+        ):
+            self.__candidate = (x, y)
+            self.__moved_at = now
+        return now - self.__moved_at >= self.__min_dwell
+
+    async def __send_pixels(
+        self, pixels: List[Tuple[Tuple[int, int], Tuple[int, int, int]]]
+    ) -> bool:
+        """
+        Sends single pixel updates, one command per write.
+
+        Args:
+            pixels (List[Tuple[Tuple[int, int], Tuple[int, int, int]]]): The ((x, y), color) of each changed pixel.
+
+        Returns:
+            bool: Whether all the commands were sent.
+        """
+        duration = 0.0
+        for command in generate_pixel_payloads(pixels):
+            if not await self.__bt.send(command):
+                return False
+            duration += self.__bt.last_send_duration
 
-        print(f"Finished plotting position {x}, {y}")
+        self.__bt.last_send_duration = duration
+        return True
+
+    async def plot_position(self, x: float, y: float):
+        """
+        Plot a position given in world coordinates, using the controller's transform.
+
+        Parameters:
+        - x (float): The x-coordinate of the position.
+        - y (float): The y-coordinate of the position.
+
+        Returns:
+        None
+        """
+        await self.plot(*self.__transform.to_cell(x, y))
+
+    @property
+    def send_duration(self) -> float:
+        """
+        Seconds taken to send the last frame to the display (None before the first frame).
+        """
+        return self.__bt.last_send_duration
 
     async def disconnect(self):
         """
@@ -89,17 +244,75 @@ class Controller:
         print("Disconnecting from Bluetooth device...")
         await self.__bt.disconnect()
 
-    def set_background(self, background: List[List[Tuple[int, int, int]]]):
+        # Image mode and the displayed frame are set again after reconnecting
+        self.__started = False
+        self.__frame = None
+        self.__displayed = None
+
+    def precompute_frames(self):
         """
-        Set the background of the controller.
+        Render and encode the frame for every position on the display with the current
+        background and beacons, so later updates are cache lookups.
+
+        Returns:
+            None
+        """
+        self.payloads.precompute(
+            self.__beacons,
+            background=self.__canvas.background,
+            background_version=self.__background_version,
+        )
+
+    def set_png_encoder(self, encoder: PngEncoder):
+        """
+        Set how full frames are encoded as PNG images (clears the frame cache).
+
+        Args:
+            encoder (PngEncoder): The PNG encoding settings.
+
+        Returns:
+            None
+        """
+        self.payloads.encoder = encoder
+        self.payloads.clear()
+
+    def set_update_policy(
+        self,
+        min_movement: int = 1,
+        min_dwell: float = 0.0,
+        refresh_interval: float = None,
+    ):
+        """
+        Set when new positions are pushed to the display.
+
+        Args:
+            min_movement (int): Minimum movement (in pixels, along either axis) from the displayed
+                position before the display is updated. Defaults to 1 (any change).
+            min_dwell (float): Seconds a new position must keep being reported before the display
+                moves to it. Defaults to 0.
+            refresh_interval (float): Seconds after which the full frame is sent again even if
+                the position has not changed. Defaults to None (never).
+
+        Returns:
+            None
+        """
+        self.__min_movement = min_movement
+        self.__min_dwell = min_dwell
+        self.__refresh_interval = refresh_interval
+
+    def set_background(self, background):
+        """
+        Set the background of the controller (copied unless it is a read-only array).
 
         Args:
-            background (List[List[Tuple[int, int, int]]]): A 2D list of tuples representing the RGB values of each pixel.
+            background (np.ndarray | List[List[Tuple[int, int, int]]]): A (32, 32, 3) uint8 array or a 2D list of tuples representing the RGB values of each pixel.
 
         Returns:
             None
         """
-        self.__background = background
+        self.__canvas.set_background(background)
+        self.__background_version += 1
+        self.__displayed = None
 
     def set_beacons(self, beacons: List[Tuple[int, int]]):
         """
@@ -115,6 +328,31 @@ class Controller:
         beacons = [(int(x), int(y)) for x, y in beacons]
 
         self.__beacons = beacons
+        self.__displayed = None
+
+    def set_transform(self, transform: GridTransform):
+        """
+        Set the transform from world coordinates to display pixels.
+
+        Args:
+            transform (GridTransform): The transform, usually shared with the trilateration controller.
+
+        Returns:
+            None
+        """
+        self.__transform = transform
+
+    def set_beacon_positions(self, positions: List[Tuple[float, float]]):
+        """
+        Set the beacons from their positions in world coordinates, using the controller's transform.
+
+        Args:
+            positions (List[Tuple[float, float]]): The world coordinates of the beacons.
+
+        Returns:
+            None
+        """
+        self.set_beacons(self.__transform.to_cells(positions).tolist())
 
 
 if __name__ == "__main__":
@@ -2,6 +2,28 @@
 RUN_PIXEL_DISPLAY = True  # Whether to run the pixel display
 GRAPH_REFRESH_INTERVAL = 2  # Refresh interval for the graph (seconds)
 DISPLAY_REFRESH_INTERVAL = 4  # Refresh interval for the pixe ldisplay (seconds)
+ASYNC_RUNTIME = False  # Run MQTT, positioning and the display as asyncio tasks instead of threads
+RUN_GRAPH = True  # Whether to show the graph (always shown by the threaded runtime)
+MESSAGE_QUEUE_SIZE = 1000  # Maximum number of queued MQTT messages (async runtime, oldest dropped first)
+EVENT_DRIVEN = False  # Recompute positions when new readings arrive instead of every DISPLAY_REFRESH_INTERVAL (always on for the async runtime)
+UPDATE_DEBOUNCE = 0.05  # Seconds to collect new readings before recomputing positions
+UPDATE_MIN_INTERVAL = 0.25  # Minimum seconds between position updates
+DISPLAY_CHUNK_DELAY = 0.01  # Seconds between the BLE chunks of a display frame (0 relies on the write to pace itself)
+DISPLAY_MAX_DELTA_PIXELS = 8  # Changed pixels sent as single pixel updates instead of a full frame (0 always sends full frames)
+DISPLAY_MIN_MOVEMENT = 1  # Pixels the position must move (along either axis) before the display is updated
+DISPLAY_MIN_DWELL = 0  # Seconds a new position must keep being reported before the display moves to it
+DISPLAY_FORCED_REFRESH = 60  # Seconds after which the full frame is resent even if nothing changed (None never)
+DISPLAY_PNG_PALETTE = False  # Encode frames as RGB PNGs (False), palette PNGs (True) or whichever is smaller ("auto"); palette PNGs are untested on the display
+DISPLAY_PNG_OPTIMIZE = True  # Let zlib search for the smallest PNG encoding
+DISPLAY_PNG_COMPRESS_LEVEL = 9  # zlib compression level of the PNG frames (0-9, ignored when optimizing)
+DISPLAY_PRECOMPUTE_FRAMES = False  # Render and encode the frame for every position at startup
+DISPLAY_WRITE_RESPONSE = None  # Write display chunks with response (True), without response (False) or the characteristic's default (None)
+
+# Devices
+DISPLAY_DEVICE = None  # BLE address shown on the display and graph (None shows the most recently seen device)
+DEVICE_TIMEOUT = 60  # Seconds without readings after which a device is no longer tracked
+RECEIVER_MAX_AGE = 10  # Seconds a receiver's latest reading of a device is used for positioning (None never expires)
+MIN_RECEIVERS = 3  # Receivers with fresh readings needed to position a device (at least 3)
 
 # Receiver 1
 RECEIVER_1_POS = (0, 2.2)
@@ -15,5 +37,17 @@ RECEIVER_2_TX_POWER = -46
 RECEIVER_3_POS = (3.2, 3.1)
 RECEIVER_3_TX_POWER = -40
 
+# All receivers (receiver N publishes to the topic receivers/N)
+RECEIVER_POSITIONS = [RECEIVER_1_POS, RECEIVER_2_POS, RECEIVER_3_POS]
+RECEIVER_TX_POWERS = [RECEIVER_1_TX_POWER, RECEIVER_2_TX_POWER, RECEIVER_3_TX_POWER]
+
 # Constants
 PATH_LOSS_EXPONENT = 1.8  # Path loss exponent (typically between 2 and 4)
+TRILATERATION_SOLVER = "least_squares"  # "least_squares", "linear", "linear_refined" or "grid"
+STRONGEST_RECEIVERS = None  # Number of strongest receivers used per fix (None uses all)
+SOLVER_WORKERS = 0  # Worker processes solving positions for many devices (0 solves in the server process)
+SOLVER_MIN_SHARD = 64  # Minimum number of devices per worker (smaller updates are solved in the server process)
+
+# Kalman filter
+KALMAN_PROCESS_NOISE_RATE = None  # Process noise per second between messages (None uses a fixed amount per message)
+KALMAN_MAX_GAP = 30  # Seconds without messages after which a filter re-acquires (time-aware mode only)
@@ -1,22 +1,299 @@
+from datetime import datetime
+
 import numpy as np
-from filterpy.kalman import KalmanFilter
 
 UNCERTAINTY = 17
 
 
+class ScalarKalmanFilter:
+    """
+    A standalone 1-D Kalman filter for a single stream of values, behind
+    `initialize_kalman_filter` / `apply_kalman_filter`. The server filters every
+    (device, receiver) channel with a `KalmanBank`, which applies the same update.
+
+    Numerically identical to a filterpy `KalmanFilter(dim_x=1, dim_z=1)` with F = H = 1
+    and the default Q = 1 (including the Joseph form covariance update).
+    """
+
+    __slots__ = ("x", "P", "Q", "R")
+
+    def __init__(
+        self,
+        x: float = 0.0,
+        P: float = 1000.0,
+        Q: float = 1.0,
+        R: float = UNCERTAINTY,
+    ):
+        self.x = x  # state
+        self.P = P  # covariance
+        self.Q = Q  # process noise
+        self.R = R  # measurement noise
+
+    def predict(self):
+        self.P += self.Q
+
+    def update(self, z: float) -> float:
+        self.x, self.P = _kalman_update(self.x, self.P, z, self.R)
+        return self.x
+
+    def __repr__(self):
+        return f"ScalarKalmanFilter(x={self.x}, P={self.P})"
+
+
 def initialize_kalman_filter():
     # Initialize the Kalman Filter
-    kf = KalmanFilter(dim_x=1, dim_z=1)
-    kf.x = np.array([0.0])  # initial state
-    kf.F = np.array([[1.0]])  # state transition matrix
-    kf.H = np.array([[1.0]])  # Measurement function
-    kf.P *= 1000.0  # covariance matrix
-    kf.R = UNCERTAINTY  # state uncertainty
-    return kf
+    # (state 0, state transition 1, measurement function 1, covariance 1000, uncertainty R)
+    return ScalarKalmanFilter(x=0.0, P=1000.0, R=UNCERTAINTY)
 
 
 def apply_kalman_filter(kf, new_value):
     # Use the Kalman Filter for the new value
     kf.predict()
-    kf.update(np.array([new_value]))
-    return kf.x  # This is the filtered value
+    return kf.update(new_value)  # This is the filtered value (float)
+
+
+class KalmanBank:
+    def __init__(
+        self,
+        capacity: int = 64,
+        initial_value: float = 0.0,
+        initial_covariance: float = 1000.0,
+        process_noise: float = 1.0,
+        measurement_noise: float = UNCERTAINTY,
+        process_noise_rate: float = None,
+        max_gap: float = None,
+    ):
+        """
+        A bank of 1-D Kalman filters, one per channel (e.g. a (device, receiver) pair).
+
+        The state and covariance of all channels are stored in contiguous arrays and each
+        update uses the same model as `ScalarKalmanFilter` (F = H = 1, Q = 1, P = 1000,
+        R = UNCERTAINTY), without allocating arrays for a 1x1 problem.
+
+        When `process_noise_rate` is set and updates come with timestamps, the filter is
+        time-aware: the process noise grows with the time since the channel's last
+        update, and after a gap longer than `max_gap` the covariance is reset so the
+        stale estimate is only coasted on until new measurements take over.
+
+        Args:
+            capacity (int, optional): Initial number of channels (grows as needed). Defaults to 64.
+            initial_value (float, optional): Initial state of a new channel. Defaults to 0.0.
+            initial_covariance (float, optional): Initial covariance of a new channel. Defaults to 1000.0.
+            process_noise (float, optional): Process noise (Q) per update. Defaults to 1.0.
+            measurement_noise (float, optional): Measurement noise (R). Defaults to UNCERTAINTY.
+            process_noise_rate (float, optional): Process noise per second between timestamped
+                updates. Defaults to None (fixed `process_noise` per update).
+            max_gap (float, optional): Gap in seconds after which a channel's covariance is
+                reset. Defaults to None (never).
+        """
+        self.initial_value = initial_value
+        self.initial_covariance = initial_covariance
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.process_noise_rate = process_noise_rate
+        self.max_gap = max_gap
+
+        # Channel key -> index into the state arrays
+        self.channels = {}
+
+        # State, covariance and last update time (seconds, NaN if unknown) of every channel
+        self.x = np.full(capacity, initial_value)
+        self.P = np.full(capacity, initial_covariance)
+        self.t = np.full(capacity, np.nan)
+
+    def __len__(self) -> int:
+        return len(self.channels)
+
+    def __contains__(self, key) -> bool:
+        return key in self.channels
+
+    def channel(self, key) -> int:
+        """
+        Gets the index of a channel, adding it if it does not exist yet.
+
+        Args:
+            key: The channel key, e.g. (address, receiver).
+
+        Returns:
+            int: The index of the channel in the state arrays.
+        """
+        index = self.channels.get(key)
+        if index is not None:
+            return index
+
+        index = len(self.channels)
+        if index == len(self.x):
+            self.__grow()
+
+        self.channels[key] = index
+        return index
+
+    def update(self, key, value: float, timestamp=None) -> float:
+        """
+        Applies the filter of one channel to a new value.
+
+        Args:
+            key: The channel key.
+            value (float): The new measurement.
+            timestamp (datetime | float, optional): Time of the measurement (datetime or
+                seconds), used by the time-aware mode. Defaults to None.
+
+        Returns:
+            float: The filtered value.
+        """
+        index = self.channel(key)
+        x = self.x.item(index)
+        P = self.P.item(index)
+
+        # Predict
+        if self.process_noise_rate is None or timestamp is None:
+            P += self.process_noise
+        else:
+            now = _to_seconds(timestamp)
+            elapsed = now - self.t.item(index)
+
+            if self.max_gap is not None and elapsed > self.max_gap:
+                # Coast over the gap: keep the estimate but trust it no more than a new channel
+                P = self.initial_covariance
+            elif elapsed > 0:
+                P += self.process_noise_rate * elapsed
+
+            # Out of order measurements do not move the channel's clock back
+            if not elapsed < 0:
+                self.t[index] = now
+
+        x, P = _kalman_update(x, P, value, self.measurement_noise)
+
+        self.x[index] = x
+        self.P[index] = P
+        return x
+
+    def update_many(self, keys: list, values: np.ndarray, timestamps=None) -> np.ndarray:
+        """
+        Applies the filters of many channels to new values at once.
+
+        Args:
+            keys (list): The channel keys, one per value.
+            values (np.ndarray): The new measurements.
+            timestamps (list, optional): Time of each measurement (datetimes or seconds),
+                used by the time-aware mode. Defaults to None.
+
+        Returns:
+            np.ndarray: The filtered values.
+        """
+        indices = np.fromiter((self.channel(key) for key in keys), dtype=int)
+        values = np.asarray(values, dtype=float)
+
+        # Repeated channels have to be applied in order
+        if len(np.unique(indices)) != len(indices):
+            if timestamps is None:
+                timestamps = [None] * len(values)
+            return np.array(
+                [
+                    self.update(key, value, timestamp)
+                    for key, value, timestamp in zip(keys, values, timestamps)
+                ]
+            )
+
+        x = self.x[indices]
+        P = self.P[indices]
+
+        # Predict
+        if self.process_noise_rate is None or timestamps is None:
+            P += self.process_noise
+        else:
+            now = np.fromiter((_to_seconds(t) for t in timestamps), dtype=float)
+            elapsed = now - self.t[indices]
+
+            # Channels without a previous time (NaN) get no extra process noise
+            P += self.process_noise_rate * np.where(elapsed > 0, elapsed, 0)
+            if self.max_gap is not None:
+                P = np.where(elapsed > self.max_gap, self.initial_covariance, P)
+
+            self.t[indices] = np.where(elapsed < 0, self.t[indices], now)
+
+        x, P = _kalman_update(x, P, values, self.measurement_noise)
+
+        self.x[indices] = x
+        self.P[indices] = P
+        return x
+
+    def value(self, key) -> float:
+        """
+        Gets the current filtered value of a channel.
+
+        Args:
+            key: The channel key.
+
+        Returns:
+            float: The filtered value, or None if the channel does not exist.
+        """
+        index = self.channels.get(key)
+        return None if index is None else self.x.item(index)
+
+    def reset(self, key):
+        """
+        Resets a channel to its initial state.
+
+        Args:
+            key: The channel key.
+        """
+        index = self.channels.get(key)
+        if index is not None:
+            self.x[index] = self.initial_value
+            self.P[index] = self.initial_covariance
+            self.t[index] = np.nan
+
+    def __grow(self):
+        """
+        Doubles the capacity of the state arrays.
+        """
+        capacity = len(self.x)
+        self.x = np.concatenate((self.x, np.full(capacity, self.initial_value)))
+        self.P = np.concatenate((self.P, np.full(capacity, self.initial_covariance)))
+        self.t = np.concatenate((self.t, np.full(capacity, np.nan)))
+
+
+def filter_stream(values: list, timestamps: list = None, **kwargs) -> np.ndarray:
+    """
+    Re-filters a recorded stream of RSSI values from a single channel.
+
+    Args:
+        values (list): The recorded measurements, in order.
+        timestamps (list, optional): Time of each measurement (datetimes or seconds).
+            Defaults to None.
+        **kwargs: Filter settings passed to `KalmanBank` (e.g. `process_noise_rate`, `max_gap`).
+
+    Returns:
+        np.ndarray: The filtered values.
+    """
+    bank = KalmanBank(capacity=1, **kwargs)
+    if timestamps is None:
+        timestamps = [None] * len(values)
+
+    return np.array(
+        [bank.update(0, value, timestamp) for value, timestamp in zip(values, timestamps)]
+    )
+
+
+def _kalman_update(x, P, z, R) -> tuple:
+    """
+    The measurement update of a 1-D Kalman filter with H = 1 (Joseph form, as in
+    filterpy), for floats or element-wise for arrays.
+
+    Returns:
+        tuple: The updated (x, P).
+    """
+    K = P / (P + R)
+    x = x + K * (z - x)
+    P = (1 - K) * P * (1 - K) + K * R * K
+    return x, P
+
+
+def _to_seconds(timestamp) -> float:
+    """
+    Converts a datetime (or a number of seconds) to seconds.
+    """
+    if isinstance(timestamp, datetime):
+        return timestamp.timestamp()
+    return float(timestamp)
@@ -0,0 +1,137 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+from transform import GridTransform
+
+# Available fingerprint matching metrics
+METRICS = ("distance", "rssi")
+
+
+class FingerprintGrid:
+    def __init__(
+        self,
+        base_stations: np.ndarray,
+        transform: GridTransform,
+        metric: str = "distance",
+    ):
+        """
+        Initialize a fingerprint grid for grid-search positioning.
+
+        The expected distance from the centre of every grid cell to every base station is
+        computed once, so a fix is a vectorized comparison against all cells.
+
+        Args:
+            base_stations (np.ndarray): A (K, 2) array of base station positions.
+            transform (GridTransform): The transform between world coordinates and cells.
+            metric (str, optional): "distance" compares distances directly, "rssi" compares
+                log distances (i.e. expected RSSI vectors, independent of the calibration)
+                using a KD-tree. Defaults to "distance".
+        """
+        if metric not in METRICS:
+            raise ValueError("Invalid metric: " + str(metric))
+
+        self.base_stations = np.asarray(base_stations, dtype=float)
+        self.transform = transform
+        self.metric = metric
+
+        # Grid cells (column i, row j) and their centres in world coordinates
+        size = transform.size
+        i, j = np.meshgrid(np.arange(size), np.arange(size), indexing="ij")
+        self.cells = np.column_stack((i.ravel(), j.ravel()))
+        self.centres = transform.to_world(self.cells)
+
+        # Expected distances (cells, K) and their squared norms
+        self.expected = np.linalg.norm(
+            self.centres[:, None] - self.base_stations[None, :], axis=2
+        )
+        self._expected_sq = np.sum(self.expected**2, axis=1)
+
+        # KD-tree over the expected log distances
+        self._tree = None
+        if metric == "rssi":
+            self._tree = cKDTree(_log_distances(self.expected))
+
+    def locate(self, *distances: float, anchors: np.ndarray = None) -> tuple:
+        """
+        Finds the grid cell that best matches the given distances.
+
+        Args:
+            *distances (float): distance from each base station to the unknown position.
+            anchors (np.ndarray, optional): Indices of the base stations the distances
+                belong to. Defaults to None (all base stations, in order).
+
+        Returns:
+            tuple: The (X, Y) coordinates of the centre of the best matching cell.
+        """
+        index = self.best_cells(np.asarray(distances, dtype=float)[None, :], anchors)[0]
+
+        x, y = self.centres[index]
+        return float(x), float(y)
+
+    def locate_batch(self, distances: np.ndarray, chunk_size: int = 4096) -> np.ndarray:
+        """
+        Finds the best matching grid cell for many fixes at once.
+
+        Args:
+            distances (np.ndarray): An (N, K) array of distances to the base stations.
+            chunk_size (int, optional): Number of fixes compared against the grid at a time,
+                which bounds the size of the intermediate (fixes, cells) array.
+                Defaults to 4096.
+
+        Returns:
+            np.ndarray: An (N, 2) array of (X, Y) cell centre coordinates.
+        """
+        distances = np.asarray(distances, dtype=float).reshape(
+            -1, len(self.base_stations)
+        )
+
+        indices = np.concatenate(
+            [
+                self.best_cells(distances[start : start + chunk_size])
+                for start in range(0, len(distances), chunk_size)
+            ]
+            or [np.empty(0, dtype=int)]
+        )
+        return self.centres[indices]
+
+    def best_cells(self, distances: np.ndarray, anchors: np.ndarray = None) -> np.ndarray:
+        """
+        Finds the index of the best matching cell for every row of `distances`.
+
+        Args:
+            distances (np.ndarray): An (N, K) array of distances.
+            anchors (np.ndarray, optional): Indices of the base stations the distances
+                belong to. Defaults to None (all base stations, in order).
+
+        Returns:
+            np.ndarray: An (N,) array of indices into `cells` / `centres`.
+        """
+        # The KD-tree only covers the full set of base stations
+        if self._tree is not None and anchors is None:
+            return self._tree.query(_log_distances(distances))[1]
+
+        expected = self.expected if anchors is None else self.expected[:, anchors]
+        if self.metric == "rssi":
+            expected, distances = _log_distances(expected), _log_distances(distances)
+            expected_sq = np.sum(expected**2, axis=1)
+        elif anchors is None:
+            expected_sq = self._expected_sq
+        else:
+            expected_sq = np.sum(expected**2, axis=1)
+
+        # |e - d|^2 = |e|^2 - 2 e.d + |d|^2, where |d|^2 does not change the best cell
+        residuals = expected_sq - 2 * distances @ expected.T
+        return np.argmin(residuals, axis=1)
+
+    def __str__(self):
+        return f"FingerprintGrid(transform={self.transform}, metric={self.metric})"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def _log_distances(distances: np.ndarray) -> np.ndarray:
+    """
+    Log distances, which differ from RSSI only by the calibration (offset and scale).
+    """
+    return np.log10(np.maximum(distances, 1e-3))
@@ -3,6 +3,8 @@ import matplotlib.pyplot as plt
 import numpy as np
 from matplotlib.animation import FuncAnimation
 
+from buffer import RingBuffer
+
 # Trilateration Graph
 TRILATERATION_ZOOMED_IN = False
 TRILATERATION_LEGEND = False
@@ -36,9 +38,10 @@ def set_on_close(func):
 def __plot_trilateration(
     base_stations: list,
     target: tuple,
-    rssi_data_1: list = None,
-    rssi_data_2: list = None,
-    rssi_data_3: list = None,
+    rssi_data_1: RingBuffer = None,
+    rssi_data_2: RingBuffer = None,
+    rssi_data_3: RingBuffer = None,
+    transform=None,
 ):
     """
     Plot the trilateration graph for indoor positioning.
@@ -48,13 +51,10 @@ def __plot_trilateration(
         - 'coords' (tuple): The coordinates of the base station in the form (x, y).
         - 'distance' (float): The distance from the base station to the target.
     - target (tuple): The estimated position of the target in the form (x, y).
-    - rssi_data_1 (list, optional): A list of dictionaries representing the RSSI data for the first beacon. Each dictionary should have the following
-    - rssi_data_2 (list, optional): A list of dictionaries representing the RSSI data for the second beacon. Each dictionary should have the following
-    - rssi_data_3 (list, optional): A list of dictionaries representing the RSSI data for the third beacon. Each dictionary should have the following
-        - 'time' (str): The timestamp of the reading.
-        - 'address' (str): The address of the beacon.
-        - 'rssi' (int): The raw RSSI value.
-        - 'filtered_rssi' (list): A list of filtered RSSI values.
+    - rssi_data_1 (RingBuffer, optional): The recent readings (time, raw RSSI and filtered RSSI) for the first beacon.
+    - rssi_data_2 (RingBuffer, optional): The recent readings for the second beacon.
+    - rssi_data_3 (RingBuffer, optional): The recent readings for the third beacon.
+    - transform (GridTransform, optional): The transform to the pixel display grid. If given, the display area and the target's cell are shown.
 
     Returns:
     None
@@ -71,9 +71,12 @@ def __plot_trilateration(
         target[0], target[1], label="Position Estimate", color="red"
     )
 
-    # Annotate the estimated position
+    # Annotate the estimated position (and its display cell)
+    label = f"({target[0]:.1f}, {target[1]:.1f})"
+    if transform is not None:
+        label += " -> {}".format(transform.to_cell(target[0], target[1]))
     trilateration_graph.annotate(
-        f"({target[0]:.1f}, {target[1]:.1f})",
+        label,
         (target[0], target[1]),
         textcoords="offset points",
         xytext=(0, 10),
@@ -136,6 +139,19 @@ def __plot_trilateration(
     trilateration_graph.axhline(0, color="black", linewidth=1.5)
     trilateration_graph.axvline(0, color="black", linewidth=1.5)
 
+    # Draw the area covered by the pixel display
+    if transform is not None:
+        display_area = plt.Rectangle(
+            transform.origin,
+            transform.extent[0],
+            transform.extent[1],
+            fill=False,
+            color="gray",
+            linestyle=":",
+            label="Display Area",
+        )
+        trilateration_graph.add_patch(display_area)
+
     if not TRILATERATION_ZOOMED_IN:
         trilateration_graph.axis(xmin=min_x, xmax=max_x, ymin=min_y, ymax=max_y)
     if TRILATERATION_LEGEND:
@@ -161,9 +177,8 @@ def __plot_trilateration(
     for i, (address, data) in enumerate(beacons.items()):
         graph = {0: rssi_graph1, 1: rssi_graph2, 2: rssi_graph3}[i]
 
-        # Get arrays for rssi and filtered rssi
-        y1 = np.array([reading["rssi"] for reading in data])
-        y2 = np.array([reading["filtered_rssi"] for reading in data])
+        # Get arrays for rssi and filtered rssi (views into the buffer)
+        _, y1, y2 = data.window()
 
         # Plot the data
         graph.plot(y1, label=f"RSSI", color=colours[0], linestyle="-")
@@ -187,6 +202,7 @@ def animate(
     target: tuple,
     get_updated_data: callable = None,
     interval: int = 1000,
+    transform=None,
 ):
     """
     Animates the trilateration graph for indoor positioning.
@@ -196,12 +212,13 @@ def animate(
     - target (tuple): The target coordinates.
     - get_updated_data (callable, optional): A function that returns updated base stations and target coordinates.
     - interval (int, optional): The interval in milliseconds between each update.
+    - transform (GridTransform, optional): The transform to the pixel display grid, used to show the display area.
 
     Returns:
     - FuncAnimation: The animation object. (call plt.show() to display the animation)
     """
     # Initial plot
-    __plot_trilateration(base_stations, target)
+    __plot_trilateration(base_stations, target, transform=transform)
 
     # Update function for the animation called every `interval`` milliseconds
     def update(i):
@@ -230,6 +247,7 @@ def animate(
                 new_rssi_data_1,
                 new_rssi_data_2,
                 new_rssi_data_3,
+                transform,
             )
 
     # Animate the plot with the update function
@@ -246,53 +264,25 @@ if __name__ == "__main__":
 
     initial_target = (1.5, 1.5)
 
-    from collections import deque
-
-    rssi_data_1 = deque(maxlen=10)
-    rssi_data_2 = deque(maxlen=10)
-    rssi_data_3 = deque(maxlen=10)
+    rssi_data_1 = RingBuffer(10)
+    rssi_data_2 = RingBuffer(10)
+    rssi_data_3 = RingBuffer(10)
 
-    # Test data
-    rssi_data_1.append(
-        {
-            "time": "2021-08-01 12:00:00",
-            "address": "address_1",
-            "rssi": -50,
-            "filtered_rssi": [-50],
-        }
-    )
-    rssi_data_2.append(
-        {
-            "time": "2021-08-01 12:00:00",
-            "address": "address_2",
-            "rssi": -60,
-            "filtered_rssi": [-60],
-        }
-    )
-    rssi_data_3.append(
-        {
-            "time": "2021-08-01 12:00:00",
-            "address": "address_3",
-            "rssi": -70,
-            "filtered_rssi": [-70],
-        }
-    )
+    # Test data (time, rssi, filtered rssi)
+    rssi_data_1.append(0, -50, -50)
+    rssi_data_2.append(0, -60, -60)
+    rssi_data_3.append(0, -70, -70)
 
     def get_updated_data():
         rssi_data_1.append(
-            {
-                "time": "2021-08-01 12:00:00",
-                "address": "address_1",
-                "rssi": np.random.randint(-70, -30),
-                "filtered_rssi": [np.random.randint(-70, -30)],
-            }
+            0, np.random.randint(-70, -30), np.random.randint(-70, -30)
         )
         return (
             base_stations,
             (np.random.randint(0, 3.2), np.random.randint(0, 3.2)),
-            list(rssi_data_1),
-            list(rssi_data_2),
-            list(rssi_data_3),
+            rssi_data_1,
+            rssi_data_2,
+            rssi_data_3,
         )
 
     # Animation
@@ -1,10 +1,14 @@
-import copy
 import io
 import struct
+import time
+from collections import OrderedDict
 from typing import List, Tuple
 
+import numpy as np
 from PIL import Image
 
+from canvas import Canvas
+
 pixel_size = 32
 
 
@@ -48,34 +52,135 @@ def __create_bt_payloads(png_data):
     return payloads
 
 
-def __create_img_buffer(
-    image_data: List[List[Tuple[int, int, int]]], rotate: int = 1, size: int = 32
-) -> io.BytesIO:
+class PngEncoder:
+    def __init__(self, palette=False, optimize: bool = True, compress_level: int = 9):
+        """
+        Encodes frames as PNG images for the display.
+
+        A frame only has a handful of colors, so it can be stored as indices into a palette
+        of exactly those colors. The palette chunk costs 3 bytes per color, which pays off
+        for busy backgrounds but not for a mostly black screen, so "auto" encodes both and
+        keeps the smaller one. Frames are RGB by default, since the display's decoder has
+        not been tried with palette images. No metadata chunks are written.
+
+        Args:
+            palette (bool | str, optional): True for a palette image (when the frame has at
+                most 256 colors), False for an RGB image, or "auto" for whichever is smaller.
+                Defaults to False.
+            optimize (bool, optional): Whether to let zlib search for the smallest encoding.
+                Defaults to True.
+            compress_level (int, optional): The zlib compression level (0-9, ignored when
+                optimizing). Defaults to 9.
+        """
+        if palette not in (True, False, "auto"):
+            raise ValueError("Invalid palette mode: " + str(palette))
+        if not 0 <= compress_level <= 9:
+            raise ValueError("Invalid compression level: " + str(compress_level))
+
+        self.palette = palette
+        self.optimize = optimize
+        self.compress_level = compress_level
+
+    def encode(self, frame: np.ndarray, rotate: int = 1) -> bytes:
+        """
+        Encode a frame as a PNG image.
+
+        Args:
+            frame (np.ndarray): The (size, size, 3) uint8 pixel data of the image.
+            rotate (int, optional): The number of 90-degree rotations to apply to the image. Defaults to 1.
+
+        Returns:
+            bytes: The PNG data.
+        """
+
+        # Rotate counter-clockwise
+        pixels = np.ascontiguousarray(np.rot90(frame, rotate))
+
+        encoded = []
+        if self.palette is not True:
+            encoded.append(self.__save(Image.fromarray(pixels)))
+        if self.palette:
+            # Colors packed into integers, so finding the palette is a 1D unique
+            packed = pixels.astype(np.uint32) @ np.array([1 << 16, 1 << 8, 1], np.uint32)
+            colors, indices = np.unique(packed, return_inverse=True)
+
+            if len(colors) <= 256:
+                img = Image.fromarray(indices.reshape(pixels.shape[:2]).astype(np.uint8))
+                img.putpalette(
+                    np.column_stack(
+                        (colors >> 16, colors >> 8 & 255, colors & 255)
+                    ).astype(np.uint8).tobytes()
+                )
+                encoded.append(self.__save(img))
+            elif not encoded:
+                encoded.append(self.__save(Image.fromarray(pixels)))
+
+        return min(encoded, key=len)
+
+    def __save(self, img: Image.Image) -> bytes:
+        """
+        Save an image as PNG data with the encoder's settings.
+        """
+        png_buffer = io.BytesIO()
+        img.save(
+            png_buffer,
+            format="PNG",
+            optimize=self.optimize,
+            compress_level=self.compress_level,
+        )
+        return png_buffer.getvalue()
+
+    def __str__(self):
+        return f"PngEncoder(palette={self.palette}, optimize={self.optimize}, compress_level={self.compress_level})"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+# PIL's default encoding (RGB, compression level 6)
+DEFAULT_ENCODER = PngEncoder(palette=False, optimize=False, compress_level=6)
+
+
+def render_frame(
+    object_coords: Tuple[int, int],
+    beacon_coords: List[Tuple[int, int]] = [],
+    object_color: tuple = (255, 0, 0),
+    beacon_color: tuple = (0, 255, 0),
+    background=None,
+) -> np.ndarray:
     """
-    Create an image buffer from the given image data.
+    Render the frame shown on the display, before rotation.
 
-    Args:
-        image_data (List[List[Tuple[int, int, int]]]): The pixel data of the image.
-        rotate (int, optional): The number of 90-degree rotations to apply to the image. Defaults to 1.
-        size (int, optional): The size of the image. Defaults to 32.
+    Parameters:
+        object_coords (Tuple[int, int]): The coordinates of the object point in the image.
+        beacon_coords (List[Tuple[int, int]], optional): The coordinates of the beacon points in the image. Defaults to an empty list.
+        object_color (tuple, optional): The color of the object point. Defaults to (255, 0, 0) (red).
+        beacon_color (tuple, optional): The color of the beacon points. Defaults to (0, 255, 0) (green).
+        background (np.ndarray | List[List[Tuple[int, int, int]]], optional): The background image data as a (32, 32, 3) uint8 array (shared without copying if read-only) or a 2D array of RGB values. Defaults to black screen.
 
     Returns:
-        io.BytesIO: The image buffer as a BytesIO object.
+        np.ndarray: The frame as a (32, 32, 3) uint8 array.
     """
+    canvas = Canvas(pixel_size, background)
+    canvas.set_layer("beacons", beacon_coords, beacon_color)
+    canvas.set_layer("objects", [object_coords], object_color)
+    return canvas.render()
 
-    # Create image
-    img = Image.new("RGB", (size, size))
-    img.putdata(image_data)
 
-    # Rotate image
-    img = img.rotate(90 * rotate)
+def generate_frame_payload(
+    frame: np.ndarray, encoder: PngEncoder = DEFAULT_ENCODER
+) -> bytearray:
+    """
+    Generate the full image payload of a rendered frame.
 
-    # Save the image as bytes
-    png_buffer = io.BytesIO()
-    img.save(png_buffer, format="PNG")
-    png_buffer.seek(0)
+    Parameters:
+        frame (np.ndarray): The frame from `render_frame`.
+        encoder (PngEncoder, optional): The PNG encoding settings. Defaults to PIL's default encoding.
 
-    return png_buffer
+    Returns:
+        bytearray: The image payload.
+    """
+    return __create_bt_payloads(encoder.encode(frame))
 
 
 def generate_image_payload(
@@ -83,7 +188,7 @@ def generate_image_payload(
     beacon_coords: List[Tuple[int, int]] = [],
     object_color: tuple = (255, 0, 0),
     beacon_color: tuple = (0, 255, 0),
-    background: List[List[Tuple[int, int, int]]] = None,
+    background=None,
 ) -> Image:
     """
     Generate an image payload with specified object coordinates, beacon coordinates, point color, and background.
@@ -93,35 +198,228 @@ def generate_image_payload(
         beacon_coords (List[Tuple[int, int]], optional): The coordinates of the beacon points in the image. Defaults to an empty list.
         object_color (tuple, optional): The color of the object point. Defaults to (255, 0, 0) (red).
         beacon_color (tuple, optional): The color of the beacon points. Defaults to (0, 255, 0) (green).
-        background (List[List[Tuple[int, int, int]]], optional): The background image data represented as a 2D array of RGB values. Defaults to black screen.
+        background (np.ndarray | List[List[Tuple[int, int, int]]], optional): The background image data as a (32, 32, 3) uint8 array or a 2D array of RGB values. Defaults to black screen.
 
     Returns:
         Image: The generated image payload.
 
     """
+    return generate_frame_payload(
+        render_frame(object_coords, beacon_coords, object_color, beacon_color, background)
+    )
+
+
+def diff_frames(
+    previous: np.ndarray, frame: np.ndarray
+) -> List[Tuple[Tuple[int, int], Tuple[int, int, int]]]:
+    """
+    Find the pixels that differ between two rendered frames.
+
+    Parameters:
+        previous (np.ndarray): The frame currently on the display.
+        frame (np.ndarray): The new frame.
+
+    Returns:
+        List[Tuple[Tuple[int, int], Tuple[int, int, int]]]: The ((x, y), color) of each changed pixel in the new frame.
+    """
+    changed = np.argwhere(np.any(previous != frame, axis=2))
+    return [((x, y), tuple(frame[x, y].tolist())) for x, y in changed.tolist()]
+
+
+def generate_pixel_payloads(
+    pixels: List[Tuple[Tuple[int, int], Tuple[int, int, int]]],
+    rotate: int = 1,
+    size: int = 32,
+) -> List[bytearray]:
+    """
+    Generate graffiti (set pixel) commands that update single pixels of the displayed frame.
+
+    Parameters:
+        pixels (List[Tuple[Tuple[int, int], Tuple[int, int, int]]]): The ((x, y), color) of each pixel, in frame coordinates (as from `diff_frames`).
+        rotate (int, optional): The number of 90-degree rotations applied to full frames. Defaults to 1.
+        size (int, optional): The size of the image. Defaults to 32.
+
+    Returns:
+        List[bytearray]: One command per pixel.
+    """
+    commands = []
+    for (x, y), (r, g, b) in pixels:
+        # Frame pixel [x][y] is image column y, row x, which each counter-clockwise
+        # rotation moves to column row, row (size - 1 - column)
+        column, row = y, x
+        for _ in range(rotate % 4):
+            column, row = row, size - 1 - column
+
+        commands.append(bytearray([10, 0, 5, 1, 0, r, g, b, column, row]))
+    return commands
+
+
+class PayloadCache:
+    def __init__(self, maxsize: int = 1024, encoder: PngEncoder = DEFAULT_ENCODER):
+        """
+        LRU cache of rendered frames and their image payloads.
+
+        For a fixed background and set of beacons there are only size x size possible
+        frames (one per object cell), so once they have been rendered and encoded, a display
+        update is a dictionary lookup.
+
+        Args:
+            maxsize (int, optional): Maximum number of cached frames. Defaults to 1024 (every
+                cell of a 32x32 display).
+            encoder (PngEncoder, optional): The PNG encoding settings. Defaults to PIL's
+                default encoding.
+        """
+        self.maxsize = maxsize
+        self.encoder = encoder
+        self.hits = 0
+        self.misses = 0
+        self.__entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def get(
+        self,
+        object_coords: Tuple[int, int],
+        beacon_coords: List[Tuple[int, int]] = [],
+        object_color: tuple = (255, 0, 0),
+        beacon_color: tuple = (0, 255, 0),
+        background=None,
+        background_version: int = 0,
+    ) -> Tuple[np.ndarray, bytes]:
+        """
+        Get the frame and image payload, rendering and encoding them if they are not cached.
+
+        Parameters:
+            object_coords (Tuple[int, int]): The coordinates of the object point in the image.
+            beacon_coords (List[Tuple[int, int]], optional): The coordinates of the beacon points in the image. Defaults to an empty list.
+            object_color (tuple, optional): The color of the object point. Defaults to (255, 0, 0) (red).
+            beacon_color (tuple, optional): The color of the beacon points. Defaults to (0, 255, 0) (green).
+            background (np.ndarray | List[List[Tuple[int, int, int]]], optional): The background image data as a (32, 32, 3) uint8 array or a 2D array of RGB values. Defaults to black screen.
+            background_version (int, optional): Identifies the background in the cache key; must change whenever the background does. Defaults to 0.
+
+        Returns:
+            Tuple[np.ndarray, bytes]: The frame (read-only) and its image payload.
+        """
+        key = (
+            background_version,
+            tuple(tuple(point) for point in beacon_coords),
+            tuple(object_coords),
+            tuple(object_color),
+            tuple(beacon_color),
+        )
+
+        entry = self.__entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.__entries.move_to_end(key)
+            return entry
+
+        self.misses += 1
+        frame = render_frame(
+            object_coords, beacon_coords, object_color, beacon_color, background
+        )
+        frame.flags.writeable = False
+        entry = (frame, bytes(generate_frame_payload(frame, self.encoder)))
+
+        self.__entries[key] = entry
+        if len(self.__entries) > self.maxsize:
+            self.__entries.popitem(last=False)
+        return entry
+
+    def precompute(
+        self,
+        beacon_coords: List[Tuple[int, int]] = [],
+        object_color: tuple = (255, 0, 0),
+        beacon_color: tuple = (0, 255, 0),
+        background=None,
+        background_version: int = 0,
+        size: int = 32,
+    ):
+        """
+        Render and encode the frame for every object cell (see `get` for the parameters).
+
+        Parameters:
+            size (int, optional): The size of the image. Defaults to 32.
+
+        Returns:
+            None
+        """
+        for x in range(size):
+            for y in range(size):
+                self.get(
+                    (x, y),
+                    beacon_coords,
+                    object_color,
+                    beacon_color,
+                    background,
+                    background_version,
+                )
+
+    def clear(self):
+        """
+        Remove all cached frames.
+        """
+        self.__entries.clear()
+
+    def __str__(self):
+        return f"PayloadCache(size={len(self.__entries)}, maxsize={self.maxsize}, hits={self.hits}, misses={self.misses})"
 
-    # Generate default 32x32 2D array of RGB values
-    if not background:
-        image_data = [[(0, 0, 0) for _ in range(32)] for _ in range(32)]
-    else:
-        image_data = copy.deepcopy(background)
+    def __repr__(self):
+        return self.__str__()
 
-    # Make points beacon points white
-    for point in beacon_coords:
-        beacon_x, beacon_y = point
-        image_data[beacon_x][beacon_y] = beacon_color
 
-    # Set the object point to the specified color
-    point_x, point_y = object_coords
-    image_data[point_x][point_y] = object_color
+def benchmark_encoders(
+    encoders: List[PngEncoder], frames: List[np.ndarray], mtu_size: int = 20
+) -> List[dict]:
+    """
+    Measure the payload size and encoding time of PNG encoders over a set of frames.
+
+    Parameters:
+        encoders (List[PngEncoder]): The encoders to compare.
+        frames (List[np.ndarray]): The frames to encode (e.g. from `render_frame`).
+        mtu_size (int, optional): The BLE write size used to count chunks. Defaults to 20.
 
-    # Flatten the 2D array to 1D
-    image_data = [pixel for row in image_data for pixel in row]
+    Returns:
+        List[dict]: For each encoder, the mean 'png_bytes', 'payload_bytes', 'chunks' and 'encode_ms' per frame.
+    """
+    results = []
+    for encoder in encoders:
+        start = time.perf_counter()
+        pngs = [encoder.encode(frame) for frame in frames]
+        elapsed = time.perf_counter() - start
 
-    # Create image buffer
-    png_buffer = __create_img_buffer(image_data)
-    return __create_bt_payloads(png_buffer.getvalue())
+        payload_sizes = [len(__create_bt_payloads(png)) for png in pngs]
+        results.append(
+            {
+                "encoder": encoder,
+                "png_bytes": sum(len(png) for png in pngs) / len(frames),
+                "payload_bytes": sum(payload_sizes) / len(frames),
+                "chunks": sum(-(-size // mtu_size) for size in payload_sizes)
+                / len(frames),
+                "encode_ms": elapsed * 1000 / len(frames),
+            }
+        )
+    return results
 
 
 if __name__ == "__main__":
     print(generate_image_payload((27, 20), [(0, 0), (0, 10), (10, 0)]))
+
+    # Compare PNG encodings over every object position
+    beacons = [(0, 0), (0, 31), (31, 0)]
+    frames = [
+        render_frame((x, y), beacons) for x in range(pixel_size) for y in range(pixel_size)
+    ]
+    encoders = [
+        DEFAULT_ENCODER,
+        PngEncoder(palette=False),
+        PngEncoder(palette=True),
+        PngEncoder(palette="auto"),
+    ]
+    for result in benchmark_encoders(encoders, frames):
+        print(
+            f"{result['encoder']}: {result['png_bytes']:.1f} PNG bytes, "
+            f"{result['payload_bytes']:.1f} payload bytes, {result['chunks']:.1f} chunks, "
+            f"{result['encode_ms']:.3f} ms per frame"
+        )
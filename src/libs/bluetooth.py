@@ -5,6 +5,7 @@ https://github.com/derkalle4/python3-idotmatrix-client/
 
 # python3 imports
 from bleak import BleakClient
+import asyncio
 import logging
 import time
 
@@ -16,10 +17,21 @@ class Bluetooth:
     client = None
     logging = logging.getLogger("idotmatrix." + __name__)
     mtu_size = None
+    chunk_delay = 0.01
+    response = None
+    last_send_duration = None
 
-    def __init__(self, address):
+    def __init__(self, address, chunk_delay=0.01, response=None):
+        """
+        `chunk_delay` is the pause (in seconds, without blocking the event loop) between
+        chunk writes. `response` selects write with response (True, each write waits for
+        the device's acknowledgement), write without response (False) or the default of
+        the characteristic (None).
+        """
         self.logging.debug("initialize bluetooth for {}".format(address))
         self.address = address
+        self.chunk_delay = chunk_delay
+        self.response = response
 
     async def response_handler(self, sender, data):
         """Simple response handler which prints the data received."""
@@ -73,11 +85,21 @@ class Bluetooth:
             if not await self.connect():
                 return False
         self.logging.debug("sending message(s) to device")
-        for data in self.splitIntoMultipleLists(message):
+        start = time.perf_counter()
+        chunks = self.splitIntoMultipleLists(message)
+        for data in chunks:
             self.logging.debug("trying to send {}".format(data))
             await self.client.write_gatt_char(
                 UUID_WRITE_DATA,
                 data,
+                response=self.response,
             )
-            time.sleep(0.01)
-        return True
\ No newline at end of file
+            if self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+        self.last_send_duration = time.perf_counter() - start
+        self.logging.debug(
+            "sent {} bytes in {} chunks in {:.3f}s".format(
+                len(message), len(chunks), self.last_send_duration
+            )
+        )
+        return True
@@ -0,0 +1,140 @@
+import json
+import struct
+
+from utils import parse_timestamp
+
+# First byte of a binary reading and batch (JSON payloads start with "{" or "[")
+MAGIC = 0xB1
+BATCH_MAGIC = 0xB2
+VERSION = 1
+
+# Binary reading: magic, version, receiver id, sequence number, epoch milliseconds,
+# 6-byte address and RSSI (little-endian, 20 bytes)
+READING = struct.Struct("<BBBHQ6sb")
+
+# Binary batch: a header (magic, version, receiver id, sequence number, epoch milliseconds
+# of the first reading, number of readings) followed by the readings (milliseconds after
+# the first reading, 6-byte address and RSSI)
+BATCH_HEADER = struct.Struct("<BBBHQB")
+BATCH_READING = struct.Struct("<H6sb")
+MAX_BATCH_SIZE = 255
+
+
+def is_binary(payload: bytes) -> bool:
+    """
+    Checks whether a payload uses the binary format.
+
+    Args:
+        payload (bytes): The MQTT message payload.
+
+    Returns:
+        bool: True for a binary payload, False otherwise (JSON).
+    """
+    return len(payload) > 0 and payload[0] in (MAGIC, BATCH_MAGIC)
+
+
+def encode_reading(
+    receiver: int, sequence: int, time: int, address: bytes, rssi: int
+) -> bytes:
+    """
+    Packs a reading into the binary payload format.
+
+    Args:
+        receiver (int): The receiver number (1 based, as in the topic receivers/N).
+        sequence (int): The sequence number of the message (wraps at 65536).
+        time (int): Time of the reading in epoch milliseconds.
+        address (bytes): The 6-byte BLE address of the device.
+        rssi (int): The RSSI value (clamped to -128..127).
+
+    Returns:
+        bytes: The payload.
+    """
+    return READING.pack(
+        MAGIC,
+        VERSION,
+        receiver,
+        sequence % 65536,
+        time,
+        bytes(address),
+        max(-128, min(127, int(rssi))),
+    )
+
+
+def encode_batch(receiver: int, sequence: int, readings: list) -> bytes:
+    """
+    Packs several readings into one binary batch payload.
+
+    Args:
+        receiver (int): The receiver number (1 based, as in the topic receivers/N).
+        sequence (int): The sequence number of the message (wraps at 65536).
+        readings (list): Up to `MAX_BATCH_SIZE` (time, address, rssi) tuples, with the
+            time in epoch milliseconds, in time order and within 65 seconds of the first.
+
+    Returns:
+        bytes: The payload.
+    """
+    if not 0 < len(readings) <= MAX_BATCH_SIZE:
+        raise ValueError("Invalid batch size: " + str(len(readings)))
+
+    start = readings[0][0]
+    payload = bytearray(
+        BATCH_HEADER.pack(
+            BATCH_MAGIC, VERSION, receiver, sequence % 65536, start, len(readings)
+        )
+    )
+    for time, address, rssi in readings:
+        payload += BATCH_READING.pack(
+            time - start, bytes(address), max(-128, min(127, int(rssi)))
+        )
+    return bytes(payload)
+
+
+def decode_readings(payload: bytes) -> list:
+    """
+    Decodes a JSON or binary payload holding one reading or a batch of readings,
+    detecting the format from the first byte.
+
+    JSON readings have the keys 'time' (epoch milliseconds, or "%d/%m/%Y %H:%M:%S" from
+    older beacons), 'address' and 'rssi', and a JSON batch is a list of them. Binary
+    readings also give the 'receiver' (1 based) and 'sequence' number of the message.
+
+    Args:
+        payload (bytes): The MQTT message payload.
+
+    Returns:
+        list: The readings (dicts), with 'time' as a datetime (formatted times) or epoch
+            seconds, 'address' as a lowercase hex string and 'rssi'.
+    """
+    if not is_binary(payload):
+        readings = json.loads(payload)
+        if isinstance(readings, dict):
+            readings = [readings]
+
+        for reading in readings:
+            reading["time"] = parse_timestamp(reading["time"])
+        return readings
+
+    if payload[0] == MAGIC:
+        if len(payload) != READING.size:
+            raise ValueError("Invalid payload length: " + str(len(payload)))
+        _, version, receiver, sequence, time, address, rssi = READING.unpack(payload)
+        entries = [(0, address, rssi)]
+    else:
+        _, version, receiver, sequence, time, count = BATCH_HEADER.unpack_from(payload)
+        if len(payload) != BATCH_HEADER.size + count * BATCH_READING.size:
+            raise ValueError("Invalid payload length: " + str(len(payload)))
+        entries = BATCH_READING.iter_unpack(payload[BATCH_HEADER.size :])
+
+    if version != VERSION:
+        raise ValueError("Invalid payload version: " + str(version))
+
+    return [
+        {
+            "time": (time + offset) / 1000,
+            "address": address.hex(),
+            "rssi": rssi,
+            "receiver": receiver,
+            "sequence": sequence,
+        }
+        for offset, address, rssi in entries
+    ]
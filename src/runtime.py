@@ -0,0 +1,281 @@
+import asyncio
+import logging
+import threading
+
+import paho.mqtt.client as mqtt
+
+from controller import Controller
+from tracking import DeviceTracker
+from trigger import AsyncUpdateTrigger
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncMqttClient:
+    def __init__(
+        self,
+        client: mqtt.Client,
+        loop: asyncio.AbstractEventLoop,
+        reconnect_delay: float = 1,
+        max_reconnect_delay: float = 120,
+    ):
+        """
+        Drives a paho MQTT client from an asyncio event loop instead of `loop_forever`.
+
+        The client's socket is registered with the event loop, so reads, writes and the
+        keep-alive housekeeping run as loop callbacks and message handlers run on the
+        loop's thread. When the connection is lost the client reconnects, doubling the
+        delay between attempts up to `max_reconnect_delay`, until `disconnect` is called.
+
+        Needs a selector event loop (on Windows, the default proactor loop cannot watch
+        sockets).
+
+        Args:
+            client (mqtt.Client): The MQTT client (callbacks already assigned).
+            loop (asyncio.AbstractEventLoop): The running event loop. Must be created on
+                the loop's thread.
+            reconnect_delay (float, optional): Seconds before the first reconnect attempt.
+                Defaults to 1.
+            max_reconnect_delay (float, optional): Maximum seconds between reconnect
+                attempts. Defaults to 120.
+        """
+        self.client = client
+        self.loop = loop
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+
+        self.__misc = None
+        self.__reconnect = None
+        self.__reconnect_wait = reconnect_delay
+        self.__disconnecting = False
+        self.__thread = threading.get_ident()
+
+        client.on_socket_open = self.__on_socket_open
+        client.on_socket_close = self.__on_socket_close
+        client.on_socket_register_write = self.__on_socket_register_write
+        client.on_socket_unregister_write = self.__on_socket_unregister_write
+
+    def disconnect(self):
+        """
+        Disconnects the client, without reconnecting.
+        """
+        self.__disconnecting = True
+        if self.__reconnect is not None:
+            self.__reconnect.cancel()
+        self.client.disconnect()
+
+    # Reconnects run on an executor thread, so the socket callbacks can come from there
+    # and are passed on to the loop's thread
+    def __on_socket_open(self, client, userdata, sock):
+        self.__call_on_loop(self.__open, sock)
+
+    def __on_socket_close(self, client, userdata, sock):
+        self.__call_on_loop(self.__close, sock)
+
+    def __on_socket_register_write(self, client, userdata, sock):
+        self.__call_on_loop(self.loop.add_writer, sock, client.loop_write)
+
+    def __on_socket_unregister_write(self, client, userdata, sock):
+        self.__call_on_loop(self.loop.remove_writer, sock)
+
+    def __call_on_loop(self, callback, *args):
+        if threading.get_ident() == self.__thread:
+            callback(*args)
+        else:
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def __open(self, sock):
+        self.loop.add_reader(sock, self.client.loop_read)
+        self.__misc = self.loop.create_task(self.__misc_loop())
+
+    def __close(self, sock):
+        self.loop.remove_reader(sock)
+        if self.__misc is not None:
+            self.__misc.cancel()
+
+        # Closed by the broker or a network error rather than `disconnect`
+        self.__schedule_reconnect()
+
+    async def __misc_loop(self):
+        # Keep-alive pings and retries (what loop_forever does between reads)
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            # Back off from scratch only once the broker has accepted the connection
+            if self.client.is_connected():
+                self.__reconnect_wait = self.reconnect_delay
+            await asyncio.sleep(1)
+
+        # The connection was lost without the socket being closed (e.g. keep-alive timeout)
+        self.__schedule_reconnect()
+
+    def __schedule_reconnect(self):
+        if not self.__disconnecting and (
+            self.__reconnect is None or self.__reconnect.done()
+        ):
+            self.__reconnect = self.loop.create_task(self.__reconnect_loop())
+
+    async def __reconnect_loop(self):
+        while True:
+            delay = self.__reconnect_wait
+            self.__reconnect_wait = min(delay * 2, self.max_reconnect_delay)
+
+            logger.warning(f"MQTT connection lost, reconnecting in {delay}s")
+            await asyncio.sleep(delay)
+            try:
+                # The connect blocks (up to the client's connect timeout), so it runs off
+                # the loop; the new socket is registered through __on_socket_open
+                await self.loop.run_in_executor(None, self.client.reconnect)
+                return
+            except OSError as e:
+                logger.error("Error reconnecting to broker: " + str(e))
+
+
+class AsyncRuntime:
+    def __init__(
+        self,
+        client: mqtt.Client,
+        host: str,
+        port: int,
+        handle_message: callable,
+        tracker: DeviceTracker,
+        display: Controller = None,
+        displayed_device: callable = None,
+        queue_size: int = 1000,
+        debounce: float = 0.05,
+        min_interval: float = 0.25,
+    ):
+        """
+        Runs the server as asyncio tasks connected by bounded queues:
+
+        MQTT client -> message queue -> ingest -> position -> display
+
+        The message queue is bounded and drops the oldest message when full, and the
+        display only ever holds the latest position, so a slow stage never blocks the ones
+        before it. All tracker updates happen on the event loop's thread.
+
+        Args:
+            client (mqtt.Client): The MQTT client (callbacks other than on_message assigned).
+            host (str): The MQTT broker host.
+            port (int): The MQTT broker port.
+            handle_message (callable): Parses a message and adds it to the tracker. Called
+                with (topic, payload); returns the number of readings added.
+            tracker (DeviceTracker): The device tracker.
+            display (Controller, optional): The pixel display. Defaults to None (no display).
+            displayed_device (callable, optional): Returns the device to show on the display.
+                Defaults to the most recently seen device.
+            queue_size (int, optional): Maximum number of queued messages. Defaults to 1000.
+            debounce (float, optional): Seconds to collect new readings before computing
+                positions. Defaults to 0.05.
+            min_interval (float, optional): Minimum seconds between position updates.
+                Defaults to 0.25.
+        """
+        self.client = client
+        self.host = host
+        self.port = port
+        self.handle_message = handle_message
+        self.tracker = tracker
+        self.display = display
+        self.displayed_device = displayed_device or tracker.latest
+        self.queue_size = queue_size
+        self.debounce = debounce
+        self.min_interval = min_interval
+
+        # Number of messages dropped because the message queue was full
+        self.dropped = 0
+
+        self.loop = None
+        self.__stopping = None
+
+    def run(self):
+        """
+        Runs the server until `stop` is called (or KeyboardInterrupt).
+        """
+        try:
+            asyncio.run(self.main())
+        except KeyboardInterrupt:
+            logger.info("Gracefully shutting down...")
+
+    def stop(self):
+        """
+        Stops the server. Safe to call from any thread.
+        """
+        if self.loop is not None and self.__stopping is not None:
+            self.loop.call_soon_threadsafe(self.__stopping.set)
+
+    async def main(self):
+        self.loop = asyncio.get_running_loop()
+        self.__stopping = asyncio.Event()
+
+        messages = asyncio.Queue(self.queue_size)
+        readings = AsyncUpdateTrigger(self.debounce, self.min_interval)
+        positions = asyncio.Queue(1)
+
+        # Queue messages from the MQTT client (runs on the loop's thread), dropping the
+        # oldest message when the queue is full
+        def on_message(client, userdata, message):
+            if messages.full():
+                messages.get_nowait()
+                self.dropped += 1
+            messages.put_nowait((message.topic, message.payload))
+
+        self.client.on_message = on_message
+        mqtt_client = AsyncMqttClient(self.client, self.loop)
+
+        logger.info("Connecting to broker")
+        self.client.connect(self.host, self.port)
+
+        tasks = [
+            asyncio.create_task(self.__ingest(messages, readings)),
+            asyncio.create_task(self.__position(readings, positions)),
+        ]
+        if self.display is not None:
+            tasks.append(asyncio.create_task(self.__display(positions)))
+
+        try:
+            await self.__stopping.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+            mqtt_client.disconnect()
+            logger.info("MQTT disconnected.")
+
+            if self.display is not None:
+                await self.display.disconnect()
+                logger.info("Bluetooth disconnected.")
+
+    async def __ingest(self, messages: asyncio.Queue, readings: AsyncUpdateTrigger):
+        while True:
+            topic, payload = await messages.get()
+            if self.handle_message(topic, payload):
+                readings.notify()
+
+    async def __position(self, readings: AsyncUpdateTrigger, positions: asyncio.Queue):
+        while True:
+            # New readings are coalesced and updates rate limited by the trigger
+            await readings.wait()
+
+            devices = await self.tracker.update_positions_async(changed_only=True)
+            for device in devices:
+                logger.info(f"{device.address} - Estimated position: {device.position}")
+
+            device = self.displayed_device()
+            if device in devices and device.position is not None:
+                _put_latest(positions, device.position)
+
+    async def __display(self, positions: asyncio.Queue):
+        while True:
+            x, y = await positions.get()
+            try:
+                await self.display.plot(x, y)
+            except Exception as e:
+                logger.error("Error updating display: " + str(e))
+
+
+def _put_latest(queue: asyncio.Queue, item):
+    """
+    Replaces whatever is waiting on a queue of size 1 with the latest item.
+    """
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(item)
@@ -1,10 +1,8 @@
 import asyncio
-import json
 import logging
 import os
 import threading
 import time
-from collections import deque
 
 import numpy as np
 import paho.mqtt.client as mqtt
@@ -13,9 +11,14 @@ from dotenv import load_dotenv
 from calc import TrilaterationController
 from controller import Controller
 from environment import *
-from filter import apply_kalman_filter, initialize_kalman_filter
+from filter import KalmanBank
 from graph import animate, set_on_close
-from utils import convert_string_to_datetime
+from image import PngEncoder
+from payload import decode_readings
+from runtime import AsyncRuntime
+from solver_pool import SolverPool
+from tracking import DeviceTracker
+from trigger import UpdateTrigger
 
 RUN_PIXEL_DISPLAY = True  # Whether to run the pixel display
 GRAPH_REFRESH_INTERVAL = 2  # Refresh interval for the graph (seconds)
@@ -50,34 +53,46 @@ client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, "SubscriberClient")
 # Set authentication for the client
 client.username_pw_set(username, password)
 
-# Stores for messages (max length 10 - removes old values when full)
-receiver_1 = deque(maxlen=20)
-receiver_2 = deque(maxlen=20)
-receiver_3 = deque(maxlen=20)
+# Initialize the trilateration controller
+locationEstimator = TrilaterationController(
+    RECEIVER_POSITIONS,
+    measured_power=RECEIVER_TX_POWERS,
+    path_loss_exponent=PATH_LOSS_EXPONENT,
+    solver=TRILATERATION_SOLVER,
+    strongest=STRONGEST_RECEIVERS,
+)
+
+# State of every device (readings per receiver, Kalman filters and last fix), keyed by address
+tracker = DeviceTracker(
+    locationEstimator,
+    KalmanBank(process_noise_rate=KALMAN_PROCESS_NOISE_RATE, max_gap=KALMAN_MAX_GAP),
+    timeout=DEVICE_TIMEOUT,
+    max_age=RECEIVER_MAX_AGE,
+    min_receivers=MIN_RECEIVERS,
+)
+
+# Wakes the processing thread when new readings arrive (event-driven mode)
+update_trigger = UpdateTrigger(UPDATE_DEBOUNCE, UPDATE_MIN_INTERVAL)
 
 # Test data
-# fmt: off
-receiver_1.append({"time": "2021-08-01 12:00:00", "address": "address_1", "rssi": -42, "filtered_rssi": [-42]})
-receiver_2.append({"time": "2021-08-01 12:00:00", "address": "address_2", "rssi": -42, "filtered_rssi": [-42]})
-receiver_3.append({"time": "2021-08-01 12:00:00", "address": "address_3", "rssi": -42, "filtered_rssi": [-42]})
-# fmt: on
+for i in range(locationEstimator.size):
+    # fmt: off
+    tracker.add_reading(i, {"time": 0, "address": "test_device", "rssi": -42})
+    # fmt: on
 
-# Initialize the Kalman filter for the 3 receivers
-kf1 = initialize_kalman_filter()
-kf2 = initialize_kalman_filter()
-kf3 = initialize_kalman_filter()
 
+def displayed_device():
+    """
+    Get the device shown on the display and graph: DISPLAY_DEVICE if it has been seen,
+    otherwise the most recently seen active device.
+    """
+    if DISPLAY_DEVICE in tracker:
+        return tracker.devices[DISPLAY_DEVICE]
 
-# Initialize the trilateration controller
-locationEstimator = TrilaterationController(
-    bp_1=RECEIVER_1_POS,
-    bp_2=RECEIVER_2_POS,
-    bp_3=RECEIVER_3_POS,
-    measured_power_1=RECEIVER_1_TX_POWER,
-    measured_power_2=RECEIVER_2_TX_POWER,
-    measured_power_3=RECEIVER_3_TX_POWER,
-    path_loss_exponent=PATH_LOSS_EXPONENT,
-)
+    active = tracker.active()
+    if len(active) == 0:
+        return None
+    return tracker.device_list[active[np.argmax(tracker.last_seen[active])]]
 
 
 # MQTT event handlers
@@ -91,29 +106,44 @@ def on_connect(client, userdata, flags, return_code):
 
 
 def on_message(client, userdata, message):
-    logging.info(message.topic + " - Received message: " + str(message.payload))
+    # message (payload, topic, timestamp)
+    if handle_message(message.topic, message.payload):
+        update_trigger.notify()
+
+
+def handle_message(topic: str, payload: bytes) -> int:
+    # Returns the number of readings added to the tracker, so the caller only wakes its
+    # position updates for new readings
+    logging.info(topic + " - Received message: " + str(payload))
+    added = 0
     try:
-        # message (payload, topic, timestamp)
-        decoded_message = str(message.payload.decode("utf-8"))
-        response = json.loads(decoded_message)  # (time, address, rssi)
-        response["time"] = convert_string_to_datetime(response["time"])
-
-        # Apply Kalman filter to the RSSI values and store them
-        if message.topic == "receivers/1":
-            response["filtered_rssi"] = apply_kalman_filter(kf1, response["rssi"])
-            receiver_1.append(response)
-        elif message.topic == "receivers/2":
-            response["filtered_rssi"] = apply_kalman_filter(kf2, response["rssi"])
-            receiver_2.append(response)
-        elif message.topic == "receivers/3":
-            response["filtered_rssi"] = apply_kalman_filter(kf3, response["rssi"])
-            receiver_3.append(response)
-        else:
-            return logging.error("Unknown topic received: " + message.topic)
+        # JSON (time, address, rssi) or binary (also receiver and sequence) readings,
+        # one per message or batched
+        readings = decode_readings(payload)
+
+        for response in readings:
+            # Receiver number from a binary payload, or from the topic (receivers/N)
+            if "receiver" in response:
+                index = response["receiver"] - 1
+            else:
+                prefix, _, number = topic.rpartition("/")
+                if prefix != "receivers" or not number.isdigit():
+                    logging.error("Unknown topic received: " + topic)
+                    continue
+                index = int(number) - 1
+            if not 0 <= index < locationEstimator.size:
+                logging.error("Unknown receiver: " + str(index + 1))
+                continue
+
+            # Apply the device's Kalman filter to the RSSI value and store it
+            tracker.add_reading(index, response)
+            added += 1
 
     except Exception as e:
         logging.error("Error processing message: " + str(e))
 
+    return added
+
 
 # Assign event handlers
 client.on_connect = on_connect
@@ -121,17 +151,27 @@ client.on_message = on_message
 
 # Bluetooth controller
 if RUN_PIXEL_DISPLAY:
-    bt = Controller("DC:03:BB:B0:67:4A")
-
-    # Set the beacons on the display
-    bt.set_beacons(
-        [
-            locationEstimator.scale_coordinates(*RECEIVER_1_POS),
-            locationEstimator.scale_coordinates(*RECEIVER_2_POS),
-            locationEstimator.scale_coordinates(*RECEIVER_3_POS),
-        ]
+    bt = Controller(
+        "DC:03:BB:B0:67:4A",
+        DISPLAY_CHUNK_DELAY,
+        DISPLAY_WRITE_RESPONSE,
+        DISPLAY_MAX_DELTA_PIXELS,
+    )
+
+    # Small PNG frames mean fewer BLE chunks per update
+    bt.set_png_encoder(
+        PngEncoder(DISPLAY_PNG_PALETTE, DISPLAY_PNG_OPTIMIZE, DISPLAY_PNG_COMPRESS_LEVEL)
     )
 
+    # Skip redundant display updates
+    bt.set_update_policy(DISPLAY_MIN_MOVEMENT, DISPLAY_MIN_DWELL, DISPLAY_FORCED_REFRESH)
+
+    # Share the coordinate transform and set the beacons on the display
+    bt.set_transform(locationEstimator.transform)
+    bt.set_beacon_positions(RECEIVER_POSITIONS)
+    if DISPLAY_PRECOMPUTE_FRAMES:
+        bt.precompute_frames()
+
     # Create a global event loop
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
@@ -154,80 +194,130 @@ if RUN_PIXEL_DISPLAY:
 
 def process_values():
     while not stop_threads:
-        if receiver_1 and receiver_2 and receiver_3:
-            logging.info(
-                f"Latest Values: {' | '.join(str(receiver[-1]['rssi']) for receiver in [receiver_1, receiver_2, receiver_3])}"
-            )
+        if EVENT_DRIVEN:
+            # Wait for new readings (waking up every second to check for shutdown)
+            if not update_trigger.wait(timeout=1):
+                continue
+
+            # Calculate the estimated position of the devices with new readings
+            devices = tracker.update_positions(changed_only=True)
+            if not devices:
+                continue
+        else:
+            # Calculate the estimated position of every active device
+            devices = tracker.update_positions()
+            if not devices:
+                logging.info("Not enough data to calculate position")
+                time.sleep(5)
+                continue
+
+        for device in devices:
             logging.info(
-                f"Latest Filtered: {' | '.join(str(receiver[-1]['filtered_rssi']) for receiver in [receiver_1, receiver_2, receiver_3])}"
+                f"{device.address} - Latest Filtered: {' | '.join(f'{rssi:.1f}' for rssi in tracker.rssi[device.index])}"
             )
-
-        # Calculate the estimated position
-        if not (receiver_1 and receiver_2 and receiver_3):
-            logging.info("Not enough data to calculate position")
-            time.sleep(5)
-            continue
-
-        rssi_1 = receiver_1[-1]["filtered_rssi"][0]
-        rssi_2 = receiver_2[-1]["filtered_rssi"][0]
-        rssi_3 = receiver_3[-1]["filtered_rssi"][0]
-
-        # Update the position
-        position = locationEstimator.get_position(rssi_1, rssi_2, rssi_3)
-        logging.info(f"Estimated position: {position}")
+            logging.info(f"{device.address} - Estimated position: {device.position}")
 
         # Update the display
-        if RUN_PIXEL_DISPLAY:
-            loop.run_until_complete(update_plot(position[0], position[1]))
+        device = displayed_device()
+        if RUN_PIXEL_DISPLAY and device is not None and device.position is not None:
+            loop.run_until_complete(update_plot(*device.position))
 
-        time.sleep(DISPLAY_REFRESH_INTERVAL)
+        if not EVENT_DRIVEN:
+            time.sleep(DISPLAY_REFRESH_INTERVAL)
 
 
 def run_graph():
     def get_updated_data():
+        # Nothing to locate until the device has a fix (its readings may be missing or
+        # stale, which the solvers cannot use)
+        device = displayed_device()
+        if device is None or device.location is None:
+            base_stations = [
+                {"coords": coords, "distance": 0} for coords in RECEIVER_POSITIONS
+            ]
+            return base_stations, (0, 0), None, None, None
+
+        # Receivers that have not heard the device get no circle
+        distances = np.nan_to_num(
+            locationEstimator.get_distances(tracker.rssi[device.index]), nan=0.0
+        )
         base_stations = [
-            {
-                "coords": RECEIVER_1_POS,
-                "distance": locationEstimator.get_distance(
-                    receiver_1[-1]["filtered_rssi"][0], 1
-                ),
-            },
-            {
-                "coords": RECEIVER_2_POS,
-                "distance": locationEstimator.get_distance(
-                    receiver_2[-1]["filtered_rssi"][0], 2
-                ),
-            },
-            {
-                "coords": RECEIVER_3_POS,
-                "distance": locationEstimator.get_distance(
-                    receiver_3[-1]["filtered_rssi"][0], 3
-                ),
-            },
+            {"coords": coords, "distance": distance}
+            for coords, distance in zip(RECEIVER_POSITIONS, distances)
         ]
-        return (
-            base_stations,
-            locationEstimator.trilaterate(
-                base_stations[0]["distance"],
-                base_stations[1]["distance"],
-                base_stations[2]["distance"],
-            ),
-            list(receiver_1),
-            list(receiver_2),
-            list(receiver_3),
-        )
+        # The RSSI graphs show the first three receivers
+        return base_stations, device.location, *device.receivers[:3]
 
     animate(
         get_updated_data()[0],
         (0, 0),
         get_updated_data,
         interval=GRAPH_REFRESH_INTERVAL * 1000,
+        transform=locationEstimator.transform,
     )
 
 
+def close_solver_pool():
+    # Only once nothing updates the tracker any more
+    if tracker.solver_pool is not None:
+        tracker.solver_pool.close()
+        tracker.solver_pool = None
+        logging.info("Solver pool closed.")
+
+
+def run_async():
+    # The MQTT socket is watched with add_reader, which Windows' default proactor event
+    # loop does not support
+    if os.name == "nt":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    runtime = AsyncRuntime(
+        client,
+        host,
+        port,
+        handle_message,
+        tracker,
+        display=bt if RUN_PIXEL_DISPLAY else None,
+        displayed_device=displayed_device,
+        queue_size=MESSAGE_QUEUE_SIZE,
+        debounce=UPDATE_DEBOUNCE,
+        min_interval=UPDATE_MIN_INTERVAL,
+    )
+
+    if not RUN_GRAPH:
+        runtime.run()
+        close_solver_pool()
+        exit(0)
+
+    # Matplotlib needs the main thread, so the event loop runs in a background thread.
+    # Only the loop's thread updates the tracker; the graph just reads it.
+    runtime_thread = threading.Thread(target=runtime.run, daemon=True)
+    runtime_thread.start()
+
+    try:
+        logging.info("Starting graph animation")
+        run_graph()
+    except KeyboardInterrupt:
+        logging.info("Gracefully shutting down...")
+
+    runtime.stop()
+    runtime_thread.join()
+    close_solver_pool()
+    exit(0)
+
+
 def run():
     global stop_threads
 
+    # Created here rather than at import, since worker processes may re-import this module
+    if SOLVER_WORKERS:
+        tracker.solver_pool = SolverPool(
+            locationEstimator, SOLVER_WORKERS, SOLVER_MIN_SHARD
+        )
+
+    if ASYNC_RUNTIME:
+        return run_async()
+
     try:
         logging.info("Connecting to broker")
         client.connect(host, port)
@@ -272,6 +362,8 @@ def run():
             loop.run_until_complete(bt.disconnect())
             logging.info("Bluetooth disconnected.")
 
+        close_solver_pool()
+
         # Exit the program
         exit(0)
 
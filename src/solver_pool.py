@@ -0,0 +1,193 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from calc import TrilaterationController
+
+# Solvers that are solved for a whole shard at once (the others warm start per device)
+BATCH_SOLVERS = ("linear", "grid")
+
+# Controller of the current worker process, built once by `_initialize_worker`
+_controller = None
+
+
+class SolverPool:
+    def __init__(
+        self,
+        controller: TrilaterationController,
+        workers: int = None,
+        min_shard: int = 64,
+    ):
+        """
+        Solves the positions of many devices in parallel worker processes.
+
+        Devices are split into contiguous shards, one per worker. The controller's
+        configuration is sent to each worker once, when the worker starts, so only the
+        RSSI rows (and warm start guesses) of each shard are sent per update. Batches too
+        small to be worth the inter-process overhead are solved in this process.
+
+        Args:
+            controller (TrilaterationController): The controller whose configuration the
+                workers use. Also used for small batches.
+            workers (int, optional): Number of worker processes. Defaults to the number of
+                CPUs.
+            min_shard (int, optional): Minimum number of devices per shard. Defaults to 64.
+        """
+        self.controller = controller
+        self.workers = workers or os.cpu_count() or 1
+        self.min_shard = min_shard
+
+        # Workers are started on the first parallel solve
+        self.__executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_initialize_worker,
+            initargs=(controller.get_config(),),
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def solve(self, rssi: np.ndarray, initial_guesses: np.ndarray = None) -> tuple:
+        """
+        Solves the position of every row of `rssi`.
+
+        Args:
+            rssi (np.ndarray): An (N, K) array of filtered RSSI values, one row per device
+                (NaN for receivers without a fresh reading).
+            initial_guesses (np.ndarray, optional): An (N, 3) array of (X, Y, r) warm start
+                guesses for the iterative solvers, NaN rows for none. Defaults to None.
+
+        Returns:
+            tuple: (solutions, iterations, converged) - an (N, 3) array of (X, Y, r)
+                solutions, and (N,) arrays of solver iterations and convergence flags.
+        """
+        rssi, initial_guesses, shards = self.__prepare(rssi, initial_guesses)
+        if shards < 2:
+            return _solve_shard(self.controller, rssi, initial_guesses)
+
+        futures = self.__submit(rssi, initial_guesses, shards)
+        return _join([future.result() for future in futures])
+
+    async def solve_async(
+        self, rssi: np.ndarray, initial_guesses: np.ndarray = None
+    ) -> tuple:
+        """
+        Like `solve`, but awaits the workers instead of blocking the event loop. Small
+        batches are still solved in this process, as `solve` does.
+
+        Args:
+            rssi (np.ndarray): An (N, K) array of filtered RSSI values, see `solve`.
+            initial_guesses (np.ndarray, optional): An (N, 3) array of warm start guesses,
+                see `solve`. Defaults to None.
+
+        Returns:
+            tuple: (solutions, iterations, converged), see `solve`.
+        """
+        rssi, initial_guesses, shards = self.__prepare(rssi, initial_guesses)
+        if shards < 2:
+            return _solve_shard(self.controller, rssi, initial_guesses)
+
+        futures = self.__submit(rssi, initial_guesses, shards)
+        return _join(
+            await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+        )
+
+    def __prepare(self, rssi, initial_guesses) -> tuple:
+        rssi = np.asarray(rssi, dtype=float).reshape(-1, self.controller.size)
+        if initial_guesses is None:
+            initial_guesses = np.full((len(rssi), 3), np.nan)
+
+        shards = min(self.workers, len(rssi) // self.min_shard)
+        return rssi, initial_guesses, shards
+
+    def __submit(self, rssi, initial_guesses, shards) -> list:
+        return [
+            self.__executor.submit(_solve_worker_shard, rows, guesses)
+            for rows, guesses in zip(
+                np.array_split(rssi, shards), np.array_split(initial_guesses, shards)
+            )
+        ]
+
+    def close(self):
+        """
+        Shuts down the worker processes.
+        """
+        self.__executor.shutdown(cancel_futures=True)
+
+    def __str__(self):
+        return f"SolverPool(workers={self.workers}, min_shard={self.min_shard})"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def _join(results: list) -> tuple:
+    """
+    Concatenates the (solutions, iterations, converged) results of the shards.
+    """
+    return tuple(np.concatenate(parts) for parts in zip(*results))
+
+
+def _initialize_worker(config: dict):
+    """
+    Builds the controller of a worker process from the shipped configuration.
+    """
+    global _controller
+    _controller = TrilaterationController(**config)
+
+
+def _solve_worker_shard(rssi: np.ndarray, initial_guesses: np.ndarray) -> tuple:
+    """
+    Solves a shard with the controller of the current worker process.
+    """
+    return _solve_shard(_controller, rssi, initial_guesses)
+
+
+def _solve_shard(
+    controller: TrilaterationController, rssi: np.ndarray, initial_guesses: np.ndarray
+) -> tuple:
+    """
+    Solves a shard of devices, see `SolverPool.solve`.
+    """
+    count = len(rssi)
+    iterations = np.zeros(count, dtype=int)
+    converged = np.ones(count, dtype=bool)
+
+    solutions = np.zeros((count, 3))
+
+    # Rows with every reading fresh are solved in one batch, the others one by one, as
+    # in `DeviceTracker.update_positions` (unrefined for "linear", to match `trilaterate`)
+    batch = np.zeros(count, dtype=bool)
+    if controller.solver in BATCH_SOLVERS and controller.strongest is None:
+        batch = np.isfinite(rssi).all(axis=1)
+
+    if batch.any():
+        solutions[batch, :2] = controller.trilaterate_batch(
+            controller.get_distances(rssi[batch]),
+            refine=controller.solver != "linear",
+        )
+
+    for i in np.flatnonzero(~batch):
+        row, guess = rssi[i], initial_guesses[i]
+        anchors = controller.select_anchors(row)
+        distances = controller.get_distances(row, anchors)
+
+        if controller.solver in BATCH_SOLVERS:
+            solutions[i, :2] = controller.trilaterate(*distances, anchors=anchors)
+            continue
+
+        results = controller.solve(
+            distances,
+            initial_guess=None if np.isnan(guess).any() else guess,
+            anchors=anchors,
+        )
+        solutions[i] = results.x
+        iterations[i] = results.njev
+        converged[i] = results.success
+
+    return solutions, iterations, converged
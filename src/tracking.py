@@ -0,0 +1,350 @@
+import time
+
+import numpy as np
+
+from buffer import RingBuffer
+from calc import TrackingSession, TrilaterationController
+from filter import KalmanBank
+from solver_pool import BATCH_SOLVERS, SolverPool
+from utils import convert_datetime_to_millis
+
+
+class Device:
+    def __init__(
+        self,
+        address: str,
+        index: int,
+        controller: TrilaterationController,
+        history: int = 20,
+    ):
+        """
+        State of a single tracked device.
+
+        Args:
+            address (str): The BLE address of the device.
+            index (int): The row of the device in the tracker's arrays.
+            controller (TrilaterationController): The controller used to solve positions.
+            history (int, optional): Number of readings kept per receiver. Defaults to 20.
+        """
+        self.address = address
+        self.index = index
+
+        # Recent readings from each receiver (max length `history` - removes old values when full)
+        self.receivers = [RingBuffer(history) for _ in range(controller.size)]
+
+        # Warm started solver and the last fix
+        self.session = TrackingSession(controller)
+        self.location = None  # (X, Y) in world coordinates
+        self.position = None  # (x, y) on the grid
+        self.fixed_at = None  # monotonic time of the last fix
+
+    def __str__(self):
+        return f"Device(address={self.address}, position={self.position})"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class DeviceTracker:
+    def __init__(
+        self,
+        controller: TrilaterationController,
+        kalman_bank: KalmanBank = None,
+        history: int = 20,
+        timeout: float = None,
+        capacity: int = 64,
+        solver_pool: SolverPool = None,
+        max_age: float = None,
+        min_receivers: int = 3,
+    ):
+        """
+        Tracks the state of every device (BLE address) seen by the receivers.
+
+        Devices are indexed by address into compact arrays holding the latest filtered
+        RSSI from each receiver and the time each device was last seen, so the positions
+        of all active devices can be computed in one pass. A device is active while at
+        least `min_receivers` receivers have fresh readings of it, and each fix only uses
+        the receivers with fresh readings.
+
+        Args:
+            controller (TrilaterationController): The controller used to solve positions.
+            kalman_bank (KalmanBank, optional): Filters for each (address, receiver) channel.
+                Defaults to a new `KalmanBank`.
+            history (int, optional): Number of readings kept per receiver. Defaults to 20.
+            timeout (float, optional): Seconds without readings after which a device is no
+                longer active. Defaults to None (never).
+            capacity (int, optional): Initial number of devices (grows as needed). Defaults to 64.
+            solver_pool (SolverPool, optional): Worker processes that solve the positions.
+                Defaults to None (solve in this process).
+            max_age (float, optional): Seconds a receiver's latest reading of a device is
+                used for. Defaults to None (until it is replaced).
+            min_receivers (int, optional): Number of receivers with fresh readings a device
+                needs to be positioned. Defaults to 3.
+        """
+        if min_receivers < 3:
+            raise ValueError("At least 3 receivers are required")
+
+        self.controller = controller
+        self.kalman_bank = kalman_bank if kalman_bank is not None else KalmanBank()
+        self.history = history
+        self.timeout = timeout
+        self.solver_pool = solver_pool
+        self.max_age = max_age
+        self.min_receivers = min_receivers
+
+        # Address -> device, and devices in index order
+        self.devices = {}
+        self.device_list = []
+
+        # Latest filtered RSSI (devices, receivers), NaN if not received yet
+        self.rssi = np.full((capacity, controller.size), np.nan)
+
+        # Monotonic time of the latest reading from each receiver (devices, receivers)
+        self.received = np.full((capacity, controller.size), -np.inf)
+
+        # Monotonic time each device was last seen and last changed since its last fix
+        self.last_seen = np.full(capacity, -np.inf)
+        self.changed = np.zeros(capacity, dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self.device_list)
+
+    def __contains__(self, address: str) -> bool:
+        return address in self.devices
+
+    def device(self, address: str) -> Device:
+        """
+        Gets a device, adding it if it has not been seen before.
+
+        Args:
+            address (str): The BLE address of the device.
+
+        Returns:
+            Device: The device.
+        """
+        device = self.devices.get(address)
+        if device is not None:
+            return device
+
+        index = len(self.device_list)
+        if index == len(self.rssi):
+            self.__grow()
+
+        device = Device(address, index, self.controller, self.history)
+        self.devices[address] = device
+        self.device_list.append(device)
+        return device
+
+    def add_reading(self, receiver: int, reading: dict) -> Device:
+        """
+        Filters and stores a reading from a receiver.
+
+        Args:
+            receiver (int): The index of the receiver (0 based).
+            reading (dict): The reading, with the keys 'time' (datetime or epoch seconds),
+                'address' and 'rssi'. The 'filtered_rssi' key is added.
+
+        Returns:
+            Device: The device the reading belongs to.
+        """
+        device = self.device(reading["address"])
+
+        # Apply the Kalman filter of the (device, receiver) channel
+        reading["filtered_rssi"] = self.kalman_bank.update(
+            (device.address, receiver), reading["rssi"], reading["time"]
+        )
+        device.receivers[receiver].append(
+            convert_datetime_to_millis(reading["time"]),
+            reading["rssi"],
+            reading["filtered_rssi"],
+        )
+
+        now = time.monotonic()
+        self.rssi[device.index, receiver] = reading["filtered_rssi"]
+        self.received[device.index, receiver] = now
+        self.last_seen[device.index] = now
+
+        # Set last, after the reading is stored (see update_positions)
+        self.changed[device.index] = True
+        return device
+
+    def fresh(self) -> np.ndarray:
+        """
+        Finds the receivers with a reading of each device that is not too old.
+
+        Returns:
+            np.ndarray: A (devices, receivers) boolean array.
+        """
+        count = len(self.device_list)
+        fresh = ~np.isnan(self.rssi[:count])
+
+        if self.max_age is not None:
+            fresh &= self.received[:count] >= time.monotonic() - self.max_age
+
+        return fresh
+
+    def active(self) -> np.ndarray:
+        """
+        Finds the devices with fresh readings from at least `min_receivers` receivers that
+        have not timed out.
+
+        Returns:
+            np.ndarray: Indices of the active devices.
+        """
+        count = len(self.device_list)
+        active = self.fresh().sum(axis=1) >= self.min_receivers
+
+        if self.timeout is not None:
+            active &= self.last_seen[:count] >= time.monotonic() - self.timeout
+
+        return np.flatnonzero(active)
+
+    def update_positions(self, changed_only: bool = False) -> list:
+        """
+        Computes the position of every active device.
+
+        The "linear" and "grid" solvers solve all devices with fresh readings from every
+        receiver in one batch; the other devices are solved one by one from the receivers
+        with fresh readings, and the iterative solvers warm start from each device's last
+        fix. With a solver pool the devices are sharded across its worker processes.
+
+        Args:
+            changed_only (bool, optional): Only update devices with new readings since their
+                last fix. Defaults to False.
+
+        Returns:
+            list: The updated devices.
+        """
+        taken = self.__take(changed_only)
+        if taken is None:
+            return []
+        devices, fresh, rssi = taken
+
+        if self.solver_pool is not None:
+            results = self.solver_pool.solve(rssi, self.__guesses(devices))
+            self.__record(devices, *results)
+            return devices
+
+        batch = np.zeros(len(devices), dtype=bool)
+        if self.controller.solver in BATCH_SOLVERS and self.controller.strongest is None:
+            batch = fresh.all(axis=1)
+
+        if batch.any():
+            # Unrefined for "linear", to match the per-fix `trilaterate`
+            locations = self.controller.trilaterate_batch(
+                self.controller.get_distances(rssi[batch]),
+                refine=self.controller.solver != "linear",
+            )
+            positions = self.controller.transform.to_cells(locations)
+
+            for i, location, position in zip(np.flatnonzero(batch), locations, positions):
+                devices[i].location = tuple(location.tolist())
+                devices[i].position = tuple(position.tolist())
+
+        for i in np.flatnonzero(~batch):
+            device, row = devices[i], rssi[i]
+            anchors = self.controller.select_anchors(row)
+            distances = self.controller.get_distances(row, anchors)
+
+            device.location = device.session.trilaterate(*distances, anchors=anchors)
+            device.position = self.controller.transform.to_cell(*device.location)
+
+        now = time.monotonic()
+        for device in devices:
+            device.fixed_at = now
+
+        return devices
+
+    async def update_positions_async(self, changed_only: bool = False) -> list:
+        """
+        Like `update_positions`, but awaits the solver pool's workers instead of blocking
+        the event loop. Without a solver pool this is `update_positions`.
+
+        Args:
+            changed_only (bool, optional): Only update devices with new readings since their
+                last fix. Defaults to False.
+
+        Returns:
+            list: The updated devices.
+        """
+        if self.solver_pool is None:
+            return self.update_positions(changed_only)
+
+        taken = self.__take(changed_only)
+        if taken is None:
+            return []
+        devices, _, rssi = taken
+
+        results = await self.solver_pool.solve_async(rssi, self.__guesses(devices))
+        self.__record(devices, *results)
+        return devices
+
+    def __take(self, changed_only: bool):
+        """
+        Takes the readings of the devices to update, clearing their changed flags.
+
+        Returns:
+            tuple: (devices, fresh, rssi) - the devices, and arrays of which of their
+                readings are fresh and of their RSSI values (NaN where stale), or None if
+                there are no devices to update.
+        """
+        indices = self.active()
+        if changed_only:
+            indices = indices[self.changed[indices]]
+        if len(indices) == 0:
+            return None
+
+        # Clear the flags before taking the readings: `add_reading` (possibly on another
+        # thread) stores the RSSI before setting the flag, so a reading that arrives from
+        # here on is either in this update or flagged for the next one
+        self.changed[indices] = False
+
+        # Stale readings are left out (NaN) so they are never selected as anchors
+        fresh = self.fresh()[indices]
+        rssi = np.where(fresh, self.rssi[indices], np.nan)
+        return [self.device_list[index] for index in indices], fresh, rssi
+
+    @staticmethod
+    def __guesses(devices: list) -> np.ndarray:
+        """
+        Gets the warm start guesses of the devices for the solver pool.
+        """
+        return np.array([device.session.solution or (np.nan,) * 3 for device in devices])
+
+    def __record(self, devices: list, solutions, iterations, converged):
+        """
+        Stores the solver pool's solutions in the devices.
+        """
+        positions = self.controller.transform.to_cells(solutions[:, :2])
+        now = time.monotonic()
+
+        for device, solution, position, count, success in zip(
+            devices, solutions, positions, iterations, converged
+        ):
+            device.session.record(tuple(solution.tolist()), int(count), bool(success))
+            device.location = device.session.solution[:2]
+            device.position = tuple(position.tolist())
+            device.fixed_at = now
+
+    def latest(self) -> Device:
+        """
+        Gets the most recently seen device.
+
+        Returns:
+            Device: The device, or None if no devices have been seen.
+        """
+        if not self.device_list:
+            return None
+        return self.device_list[int(np.argmax(self.last_seen[: len(self.device_list)]))]
+
+    def __grow(self):
+        """
+        Doubles the capacity of the device arrays.
+        """
+        capacity = len(self.rssi)
+        self.rssi = np.concatenate((self.rssi, np.full_like(self.rssi, np.nan)))
+        self.received = np.concatenate(
+            (self.received, np.full_like(self.received, -np.inf))
+        )
+        self.last_seen = np.concatenate((self.last_seen, np.full(capacity, -np.inf)))
+        self.changed = np.concatenate((self.changed, np.zeros(capacity, dtype=bool)))
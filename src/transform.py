@@ -0,0 +1,108 @@
+import numpy as np
+
+
+class GridTransform:
+    def __init__(
+        self,
+        extent: tuple,
+        size: int = 32,
+        origin: tuple = (0, 0),
+        clamp: bool = True,
+    ):
+        """
+        Initialize the transform from world coordinates (meters) to grid cells.
+
+        Args:
+            extent (tuple): The (x, y) size of the area covered by the grid.
+            size (int, optional): Number of cells along each axis. Defaults to 32.
+            origin (tuple, optional): World coordinates of the grid corner. Defaults to (0, 0).
+            clamp (bool, optional): Whether to clamp cells to the grid. Defaults to True.
+        """
+        self.origin = tuple(float(value) for value in origin)
+        self.extent = tuple(float(value) for value in extent)
+        self.size = size
+        self.clamp = clamp
+
+        # Cells per meter along each axis, and the size of a cell in meters
+        self.factor = (size / self.extent[0], size / self.extent[1])
+        self.cell_size = (self.extent[0] / size, self.extent[1] / size)
+
+        # Array forms for the vectorized methods
+        self._origin = np.array(self.origin)
+        self._factor = np.array(self.factor)
+        self._cell_size = np.array(self.cell_size)
+
+    @classmethod
+    def from_base_stations(cls, base_stations: np.ndarray, size: int = 32):
+        """
+        Creates the transform used for the display, covering the area from the origin to
+        the maximum x and y of the base stations.
+
+        Args:
+            base_stations (np.ndarray): A (K, 2) array of base station positions.
+            size (int, optional): Number of cells along each axis. Defaults to 32.
+
+        Returns:
+            GridTransform: The transform.
+        """
+        return cls(np.asarray(base_stations, dtype=float).max(axis=0), size)
+
+    def to_cell(self, x: float, y: float) -> tuple:
+        """
+        Converts world coordinates to a grid cell.
+
+        Args:
+            x (float): The x-coordinate.
+            y (float): The y-coordinate.
+
+        Returns:
+            tuple: The (x, y) cell.
+        """
+        cell_x = int((x - self.origin[0]) * self.factor[0])
+        cell_y = int((y - self.origin[1]) * self.factor[1])
+
+        # Ensure the cell is within the grid
+        if self.clamp:
+            last = self.size - 1
+            cell_x = 0 if cell_x < 0 else last if cell_x > last else cell_x
+            cell_y = 0 if cell_y < 0 else last if cell_y > last else cell_y
+
+        return cell_x, cell_y
+
+    def to_cells(self, points: np.ndarray) -> np.ndarray:
+        """
+        Converts an (N, 2) array of world coordinates to grid cells.
+
+        Args:
+            points (np.ndarray): The (x, y) coordinates, one row per point.
+
+        Returns:
+            np.ndarray: An (N, 2) integer array of cells.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+
+        # Truncate towards zero, like `to_cell`
+        cells = ((points - self._origin) * self._factor).astype(int)
+        if self.clamp:
+            np.clip(cells, 0, self.size - 1, out=cells)
+
+        return cells
+
+    def to_world(self, cells: np.ndarray) -> np.ndarray:
+        """
+        Converts an (N, 2) array of grid cells to the world coordinates of their centres.
+
+        Args:
+            cells (np.ndarray): The (x, y) cells, one row per cell.
+
+        Returns:
+            np.ndarray: An (N, 2) array of world coordinates.
+        """
+        cells = np.asarray(cells, dtype=float).reshape(-1, 2)
+        return (cells + 0.5) * self._cell_size + self._origin
+
+    def __str__(self):
+        return f"GridTransform(origin={self.origin}, extent={self.extent}, size={self.size})"
+
+    def __repr__(self):
+        return self.__str__()
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import time
+
+
+class UpdateTrigger:
+    def __init__(self, debounce: float = 0.05, min_interval: float = 0.25):
+        """
+        Wakes a worker thread when new data arrives, coalescing bursts of notifications.
+
+        After the first notification the worker waits `debounce` seconds so that readings
+        arriving together (e.g. from every receiver for one advertisement) are handled in
+        one update, and updates are never closer together than `min_interval` seconds.
+
+        Args:
+            debounce (float, optional): Seconds to collect notifications before firing.
+                Defaults to 0.05.
+            min_interval (float, optional): Minimum seconds between updates. Defaults to 0.25.
+        """
+        self.debounce = debounce
+        self.min_interval = min_interval
+
+        # Number of notifications coalesced into the last update
+        self.coalesced = 0
+
+        self.__condition = threading.Condition()
+        self.__pending = 0
+        self.__first = 0.0
+        self.__last_fired = -float("inf")
+
+    def notify(self):
+        """
+        Signals that new data is available. Safe to call from any thread.
+        """
+        with self.__condition:
+            if not self.__pending:
+                self.__first = time.monotonic()
+            self.__pending += 1
+            self.__condition.notify()
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Blocks until an update is due.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait for a notification. Defaults
+                to None (wait forever).
+
+        Returns:
+            bool: True if an update is due, False if the timeout expired first.
+        """
+        with self.__condition:
+            if not self.__condition.wait_for(lambda: self.__pending, timeout):
+                return False
+            due = _due(self.__first, self.__last_fired, self.debounce, self.min_interval)
+
+        # Let more notifications arrive before firing
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        with self.__condition:
+            self.coalesced = self.__pending
+            self.__pending = 0
+            self.__last_fired = time.monotonic()
+        return True
+
+
+class AsyncUpdateTrigger:
+    def __init__(self, debounce: float = 0.05, min_interval: float = 0.25):
+        """
+        The asyncio version of `UpdateTrigger`, for tasks on a single event loop.
+
+        Args:
+            debounce (float, optional): Seconds to collect notifications before firing.
+                Defaults to 0.05.
+            min_interval (float, optional): Minimum seconds between updates. Defaults to 0.25.
+        """
+        self.debounce = debounce
+        self.min_interval = min_interval
+
+        # Number of notifications coalesced into the last update
+        self.coalesced = 0
+
+        self.__event = asyncio.Event()
+        self.__pending = 0
+        self.__first = 0.0
+        self.__last_fired = -float("inf")
+
+    def notify(self):
+        """
+        Signals that new data is available. Must be called from the event loop's thread.
+        """
+        if not self.__pending:
+            self.__first = time.monotonic()
+        self.__pending += 1
+        self.__event.set()
+
+    async def wait(self):
+        """
+        Waits until an update is due.
+        """
+        await self.__event.wait()
+
+        # Let more notifications arrive before firing
+        due = _due(self.__first, self.__last_fired, self.debounce, self.min_interval)
+        delay = due - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        self.__event.clear()
+        self.coalesced = self.__pending
+        self.__pending = 0
+        self.__last_fired = time.monotonic()
+
+
+def _due(first: float, last_fired: float, debounce: float, min_interval: float) -> float:
+    """
+    Time the next update is due: `debounce` after the first pending notification, but no
+    sooner than `min_interval` after the last update.
+    """
+    return max(first + debounce, last_fired + min_interval)
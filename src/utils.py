@@ -1,5 +1,49 @@
+import calendar
 from datetime import datetime
+from functools import lru_cache
 
+# Format of the times sent by the beacons, e.g. "05/03/2024 14:07:09"
+DATETIME_FORMAT = "%d/%m/%Y %H:%M:%S"
 
+
+@lru_cache(maxsize=256)
 def convert_string_to_datetime(date_string: str) -> datetime:
-    return datetime.strptime(date_string, "%d/%m/%Y %H:%M:%S")
+    # Readings arrive many per second, so parse each distinct (second resolution) string
+    # once, by slicing the fixed-width format; anything else goes through strptime
+    if (
+        len(date_string) == 19
+        and date_string[2] == date_string[5] == "/"
+        and date_string[10] == " "
+        and date_string[13] == date_string[16] == ":"
+    ):
+        return datetime(
+            int(date_string[6:10]),
+            int(date_string[3:5]),
+            int(date_string[0:2]),
+            int(date_string[11:13]),
+            int(date_string[14:16]),
+            int(date_string[17:19]),
+        )
+    return datetime.strptime(date_string, DATETIME_FORMAT)
+
+
+def parse_timestamp(value):
+    # Formatted strings become datetimes; numbers (or digit strings) are epoch
+    # milliseconds and become epoch seconds
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        if not value.isdigit():
+            return convert_string_to_datetime(value)
+        value = int(value)
+    return value / 1000
+
+
+def convert_datetime_to_millis(value) -> int:
+    # Naive datetimes are UTC (the beacons get their time from NTP with no offset);
+    # numbers are epoch seconds
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            return int(value.timestamp() * 1000)
+        return calendar.timegm(value.timetuple()) * 1000 + value.microsecond // 1000
+    return int(value * 1000)